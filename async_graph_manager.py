@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from utils.async_neo4j_utils import AsyncNeo4jUtils
+from utils.graph_query_utils import complication_hops, diagnosis_query, result_cache
+from utils.medical_utils import DISEASE_DEGREE_PROPERTY, SYMPTOM_WEIGHT_PROPERTY
+from utils.logger_utils import info
+
+
+async_graph_db_utils = AsyncNeo4jUtils()
+
+
+@result_cache.memoize
+async def query_disease_by_symptom(symptoms, top_k=3):
+    """
+    根据症状查询疾病 - graph_manager.query_disease_by_symptom 的异步版本
+    """
+    result = await async_graph_db_utils.rank_related_nodes(
+        "Symptom", symptoms, "symptom_disease", "Disease", top_k,
+        weight_property=SYMPTOM_WEIGHT_PROPERTY, degree_property=DISEASE_DEGREE_PROPERTY)
+    if not result['success']:
+        return [], []
+
+    sorted_diseases = [(record['name'], {"count": record['count'], "score": record['score'],
+                                         "properties": record['properties']})
+                       for record in result['records']]
+    return sorted_diseases, [disease[0] for disease in sorted_diseases]
+
+
+@result_cache.memoize
+async def query_drug_by_disease(diseases, top_k=3):
+    """
+    根据疾病查询药品 - graph_manager.query_drug_by_disease 的异步版本
+    """
+    result = await async_graph_db_utils.rank_related_nodes(
+        "Disease", diseases, "recommand_drug", "Drug", top_k, with_properties=False)
+    if not result['success']:
+        return []
+
+    return [record['name'] for record in result['records']]
+
+
+@result_cache.memoize
+async def query_diagnosis_by_symptom(symptoms, top_k=3, drug_k=3):
+    """
+    根据症状一次查询出诊断所需的全部上下文 - graph_manager.query_diagnosis_by_symptom 的异步版本
+    """
+    result = await async_graph_db_utils.run_cypher(
+        diagnosis_query, {"symptoms": list(symptoms), "top_k": top_k, "drug_k": drug_k}, write=False)
+    if not result['success'] or not result['records']:
+        return [], [], []
+
+    record = result['records'][0]
+    sorted_diseases = [(disease['name'], {"count": disease['count'], "score": disease['score'],
+                                          "properties": disease['properties']})
+                       for disease in record['diseases']]
+    return sorted_diseases, [disease[0] for disease in sorted_diseases], record['drugs']
+
+
+@result_cache.memoize
+async def query_complications_by_symptom(symptoms, disease_k=3, complication_k=5, drug_k=5):
+    """
+    根据症状查询疾病、并发症及其用药 - graph_manager.query_complications_by_symptom 的异步版本
+    """
+    result = await async_graph_db_utils.traverse(
+        "Symptom", symptoms, complication_hops(disease_k, complication_k, drug_k))
+    if not result['success']:
+        return [], [], []
+
+    diseases, complications, drugs = result['hops']
+    return ([disease['name'] for disease in diseases],
+            [{'name': node['name'], 'count': node['count'], 'sources': node['sources']} for node in complications],
+            [drug['name'] for drug in drugs])
+
+
+async def serve_concurrently(symptom_sets, concurrency=200):
+    """在一个事件循环中并发执行多个诊断查询，报告总耗时和吞吐量"""
+    begin = time.perf_counter()
+    results = await asyncio.gather(*[
+        query_diagnosis_by_symptom(symptom_sets[i % len(symptom_sets)]) for i in range(concurrency)])
+    elapsed = time.perf_counter() - begin
+    info(f"并发诊断 {concurrency} 个: 耗时 {elapsed:.2f}s, {concurrency / elapsed:.0f} 个/秒")
+    return results
+
+
+async def main():
+    try:
+        _, disease_names, drug_names = await query_diagnosis_by_symptom(["流鼻涕", "咽痛", "头痛"])
+        info(f"疾病名称: {disease_names}")
+        info(f"药品名称: {drug_names}")
+        await serve_concurrently([["流鼻涕", "咽痛", "头痛"], ["咳嗽", "发热"], ["腹痛", "腹泻"]])
+    finally:
+        await async_graph_db_utils.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
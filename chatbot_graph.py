@@ -1,7 +1,7 @@
 import json
 import sys
 import time
-from graph_manager import query_disease_by_symptom, query_drug_by_disease
+from graph_manager import graph_db_utils, query_diagnosis_by_symptom, result_cache
 from llm_summary import llm_summary
 from question_parser import extract_entity_from_question, query_data_from_chroma
 from utils.logger_utils import info
@@ -32,7 +32,7 @@ class ChatBotGraph:
         time.sleep(0.5)
         print(" ✓")
 
-        diseases, disease_names = query_disease_by_symptom(
+        diseases, disease_names, drug_names = query_diagnosis_by_symptom(
             symptoms_from_chroma)
 
         info(f"诊断疾病名称: {disease_names}")
@@ -41,9 +41,9 @@ class ChatBotGraph:
         time.sleep(0.5)
         print(" ✓")
 
-        drug_names = query_drug_by_disease(disease_names)
-
         info(f"推荐药品名称: {drug_names}")
+        info(f"Neo4j连接池指标: {graph_db_utils.metrics()}")
+        info(f"结果缓存指标: {result_cache.metrics()}")
 
         print("华佗: 正在生成诊断建议...", end='', flush=True)
         time.sleep(0.5)
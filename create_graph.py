@@ -1,215 +1,168 @@
+import argparse
+import csv
 import os
+import time
+from datetime import datetime
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
 from tqdm import tqdm
 import json
 
 from utils.chroma_utils import ChromeUtils
-from utils.logger_utils import info
+from utils.entity_matcher_utils import EntityMatcher
+from utils.logger_utils import info, error
+from utils.medical_utils import DISEASE_DEGREE_PROPERTY, EDGE_KINDS, SYMPTOM_WEIGHT_PROPERTY, DiseaseRecord, \
+    EdgeRecord, EntityRecord, iter_disease_digests, iter_medical_records, peak_rss_mb, stable_id
 from utils.neo4j_utils import Neo4jUtils, Node, Relationship
 
 data_path = os.getcwd() + '/data/medical.json'
-graph_db_utils = Neo4jUtils()
-chroma_utils = ChromeUtils()
+batch_size = int(os.getenv('NEO4J_BATCH_SIZE', 1000))
+delete_chunk_size = int(os.getenv('NEO4J_DELETE_CHUNK_SIZE', 10000))
+# 症状、药品节点由集合去重生成，可加唯一约束；疾病名称可能重复，只建普通索引
+unique_labels = ['Symptom', 'Drug']
+indexed_labels = ['Disease']
+# 写入图谱的关系种类，见 EDGE_KINDS
+loaded_edge_kinds = ['recommanddrug', 'commonddrug', 'symptom', 'acompany']
+# 疾病属性中的列表字段，导出CSV时声明为 string[]
+disease_array_fields = {'cure_department', 'cure_way'}
+manifest_path = os.getenv('GRAPH_MANIFEST_PATH', os.getcwd() + '/.graph_manifest.json')
+# 实体名称精确匹配自动机，查询时由 question_parser 加载
+entity_matcher_path = os.getenv('ENTITY_MATCHER_PATH', os.getcwd() + '/.entity_matcher.pkl')
+# 数据库和向量库客户端在 main() 中创建：向量编码进程池以 spawn 方式启动时会重新导入本模块，
+# 模块导入不能有加载模型、打开连接之类的副作用
+graph_db_utils = None
+chroma_utils = None
 
 def read_nodes(data_path):
-    # 共７类节点
-    drugs = []  # 药品
-    foods = []  # 　食物
-    checks = []  # 检查
-    departments = []  # 科室
-    producers = []  # 药品大类
-    diseases = []  # 疾病
-    symptoms = []  # 症状
-
+    """
+    汇总流式解析结果，保持原有的返回值结构
+    """
+    entities = defaultdict(set)
+    edges = defaultdict(list)
     disease_infos = []  # 疾病信息
 
-    # 构建节点实体关系
-    rels_department = []  # 　科室－科室关系
-    rels_noteat = []  # 疾病－忌吃食物关系
-    rels_doeat = []  # 疾病－宜吃食物关系
-    rels_recommandeat = []  # 疾病－推荐吃食物关系
-    rels_commonddrug = []  # 疾病－通用药品关系
-    rels_recommanddrug = []  # 疾病－热门药品关系
-    rels_check = []  # 疾病－检查关系
-    rels_drug_producer = []  # 厂商－药物关系
-
-    rels_symptom = []  # 疾病症状关系
-    rels_acompany = []  # 疾病并发关系
-    rels_category = []  # 　疾病与科室之间的关系
-
-    count = 0
-    for data in open(data_path):
-        disease_dict = {}
-        count += 1
-        data_json = json.loads(data)
-        disease = data_json['name']
-        disease_dict['name'] = disease
-        diseases.append(disease)
-        disease_dict['desc'] = ''
-        disease_dict['prevent'] = ''
-        disease_dict['cause'] = ''
-        disease_dict['easy_get'] = ''
-        disease_dict['cure_department'] = ''
-        disease_dict['cure_way'] = ''
-        disease_dict['cure_lasttime'] = ''
-        disease_dict['symptom'] = ''
-        disease_dict['cured_prob'] = ''
-
-        if 'symptom' in data_json:
-            symptoms += data_json['symptom']
-            for symptom in data_json['symptom']:
-                rels_symptom.append([symptom,disease])
-
-        if 'acompany' in data_json:
-            for acompany in data_json['acompany']:
-                rels_acompany.append([disease, acompany])
-
-        if 'desc' in data_json:
-            disease_dict['desc'] = data_json['desc']
-
-        if 'prevent' in data_json:
-            disease_dict['prevent'] = data_json['prevent']
-
-        if 'cause' in data_json:
-            disease_dict['cause'] = data_json['cause']
-
-        if 'get_prob' in data_json:
-            disease_dict['get_prob'] = data_json['get_prob']
-
-        if 'easy_get' in data_json:
-            disease_dict['easy_get'] = data_json['easy_get']
-
-        if 'cure_department' in data_json:
-            cure_department = data_json['cure_department']
-            if len(cure_department) == 1:
-                rels_category.append([disease, cure_department[0]])
-            if len(cure_department) == 2:
-                big = cure_department[0]
-                small = cure_department[1]
-                rels_department.append([small, big])
-                rels_category.append([disease, small])
-
-            disease_dict['cure_department'] = cure_department
-            departments += cure_department
-
-        if 'cure_way' in data_json:
-            disease_dict['cure_way'] = data_json['cure_way']
-
-        if 'cure_lasttime' in data_json:
-            disease_dict['cure_lasttime'] = data_json['cure_lasttime']
-
-        if 'cured_prob' in data_json:
-            disease_dict['cured_prob'] = data_json['cured_prob']
-
-        if 'common_drug' in data_json:
-            common_drug = data_json['common_drug']
-            for drug in common_drug:
-                rels_commonddrug.append([disease, drug])
-            drugs += common_drug
-
-        if 'recommand_drug' in data_json:
-            recommand_drug = data_json['recommand_drug']
-            drugs += recommand_drug
-            for drug in recommand_drug:
-                rels_recommanddrug.append([disease, drug])
-
-        if 'not_eat' in data_json:
-            not_eat = data_json['not_eat']
-            for _not in not_eat:
-                rels_noteat.append([disease, _not])
-
-            foods += not_eat
-            do_eat = data_json['do_eat']
-            for _do in do_eat:
-                rels_doeat.append([disease, _do])
-
-            foods += do_eat
-            recommand_eat = data_json['recommand_eat']
-
-            for _recommand in recommand_eat:
-                rels_recommandeat.append([disease, _recommand])
-            foods += recommand_eat
-
-        if 'check' in data_json:
-            check = data_json['check']
-            for _check in check:
-                rels_check.append([disease, _check])
-            checks += check
-        if 'drug_detail' in data_json:
-            drug_detail = data_json['drug_detail']
-            producer = [i.split('(')[0] for i in drug_detail]
-            rels_drug_producer += [[i.split('(')[0], i.split(
-                '(')[-1].replace(')', '')] for i in drug_detail]
-            producers += producer
-        disease_infos.append(disease_dict)
-    return set(drugs), set(foods), set(checks), set(departments), set(producers), set(symptoms), set(diseases), disease_infos, \
-        rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug, \
-        rels_symptom, rels_acompany, rels_category
+    begin = time.perf_counter()
+    for record in iter_medical_records(data_path):
+        if isinstance(record, EdgeRecord):
+            edges[record.kind].append([record.start, record.end])
+        elif isinstance(record, EntityRecord):
+            entities[record.label].add(record.name)
+        else:
+            disease_infos.append(record.properties)
+            entities['Disease'].add(record.properties['name'])
+    info(f"解析文档耗时 {time.perf_counter() - begin:.2f}s, 峰值内存 {peak_rss_mb():.1f}MB")
+
+    return entities['Drug'], entities['Food'], entities['Check'], entities['Department'], entities['Producer'], entities['Symptom'], entities['Disease'], disease_infos, \
+        edges['check'], edges['recommandeat'], edges['noteat'], edges['doeat'], edges['department'], edges['commonddrug'], edges['drug_producer'], edges['recommanddrug'], \
+        edges['symptom'], edges['acompany'], edges['category']
 
 
 '''建立节点'''
 
 
 def create_node_by_label_and_nodes(label, node_names):
-    nodes = []
-    for node_name in node_names:
-        properties = {'name': node_name}
-        result = graph_db_utils.create_node(label, properties)
-        if result['success']:
-            nodes.append(result['node'])
-    return nodes
+    rows = [{'name': node_name} for node_name in node_names]
+    result = graph_db_utils.create_nodes_bulk(label, rows, batch_size)
+    return result['nodes']
+
+
+def disease_properties(disease_dict):
+    return {
+        'name': disease_dict['name'],
+        'desc': disease_dict['desc'],
+        'prevent': disease_dict['prevent'],
+        'cause': disease_dict['cause'],
+        'easy_get': disease_dict['easy_get'],
+        'cure_lasttime': disease_dict['cure_lasttime'],
+        'cure_department': disease_dict['cure_department'],
+        'cure_way': disease_dict['cure_way'],
+        'cured_prob': disease_dict['cured_prob']
+    }
 
 
 '''创建知识图谱中心疾病的节点'''
 def create_diseases_nodes(disease_infos):
-    nodes = []
-    for disease_dict in disease_infos:
-        properties = {
-            'name': disease_dict['name'],
-            'desc': disease_dict['desc'],
-            'prevent': disease_dict['prevent'],
-            'cause': disease_dict['cause'],
-            'easy_get': disease_dict['easy_get'],
-            'cure_lasttime': disease_dict['cure_lasttime'],
-            'cure_department': disease_dict['cure_department'],
-            'cure_way': disease_dict['cure_way'],
-            'cured_prob': disease_dict['cured_prob']
-        }
-        result = graph_db_utils.create_node("Disease", properties)
-        if result['success']:
-            nodes.append(result['node'])
-    return nodes
+    rows = [disease_properties(disease_dict) for disease_dict in disease_infos]
+    result = graph_db_utils.create_nodes_bulk("Disease", rows, batch_size)
+    return result['nodes']
 
 
 '''创建实体关联边'''
 
 
 def create_relationship(start_node_label, end_node_label, edges, rel_type, rel_name):
-    relationships = []
-    for edge in edges:
-        from_node = {'label': start_node_label, 'properties': {'name': edge[0]}}
-        to_node = {'label': end_node_label, 'properties': {'name': edge[1]}}
-        try:
-            result = graph_db_utils.create_relationship(from_node, rel_type, to_node, properties={'name': rel_name})
-            if result['success']:
-                relationships.append(result['relationship'])
-        except Exception as e:
-            print(e)
-    return relationships
+    result = graph_db_utils.create_relationships_bulk(
+        start_node_label, rel_type, end_node_label, edges,
+        properties={'name': rel_name}, batch_size=batch_size)
+    return result['failed']
 
 
 def insert_nodes_2_chroma(nodes,label):
-    for node in nodes:
-        if isinstance(node, Node):
-            info(f"向chroma插入节点: {node.labels},{node.properties['name']}")
-            chroma_utils.add_document(
-                node.properties['name'],
-                {"label":label},
-                [str(node.id)])
-
-
-if __name__ == "__main__":
-    # 0，清空数据库
-    graph_db_utils.delete_all_nodes_and_relationships()
+    # 各种构建方式统一以 stable_id(标签, 名称) 作为chroma id，同名疾病只保留一条向量
+    names = list(dict.fromkeys(node.properties['name'] for node in nodes if isinstance(node, Node)))
+    if not names:
+        return
+    info(f"向chroma插入节点: {label}, {len(names)} 个")
+    chroma_utils.add_documents_bulk(
+        names,
+        [{"label": label} for _ in names],
+        [stable_id(label, name) for name in names])
+
+
+def load_manifest():
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(digests):
+    manifest = {
+        'version': datetime.now().strftime('%Y%m%d%H%M%S%f'),
+        # chroma 向量id的规则，旧清单（以Neo4j内部id为向量id）不能用于增量构建
+        'chroma_ids': 'uid',
+        'diseases': digests,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    info(f"构建清单已写入: {manifest_path}, 版本 {manifest['version']}")
+    return manifest
+
+
+def collect_disease_digests(data_path):
+    """疾病名称 -> 该名称下所有记录的内容哈希列表（名称可能重复）"""
+    digests = defaultdict(list)
+    for name, digest in iter_disease_digests(data_path):
+        digests[name].append(digest)
+    return dict(digests)
+
+
+def create_edges(edges_by_kind):
+    failed = []
+    for kind in loaded_edge_kinds:
+        start_label, rel_type, end_label, rel_name = EDGE_KINDS[kind]
+        failed += create_relationship(start_label, end_label, edges_by_kind[kind], rel_type, rel_name)
+    return failed
+
+
+def update_ranking_stats():
+    """关系写完后预计算症状特异性权重和疾病的症状数，供 graph_manager 加权排序"""
+    start_label, rel_type, end_label, _ = EDGE_KINDS['symptom']
+    return graph_db_utils.update_specificity_weights(
+        start_label, rel_type, end_label, SYMPTOM_WEIGHT_PROPERTY, DISEASE_DEGREE_PROPERTY)
+
+
+def save_entity_matcher():
+    """由全部疾病、症状、药品名称生成精确匹配自动机并保存"""
+    EntityMatcher.from_data(data_path).save(entity_matcher_path)
+
+
+def full_build(drop_schema=False):
+    # 0，清空数据库和向量
+    graph_db_utils.delete_all_nodes_and_relationships(delete_chunk_size, drop_schema)
+    chroma_utils.clear_documents()
 
     # 1，解析文档 获取节点 和 关系
     drugs, foods, checks, departments, producers, symptoms, diseases, disease_infos, rels_check, rels_recommandeat, rels_noteat, rels_doeat, rels_department, rels_commonddrug, rels_drug_producer, rels_recommanddrug, rels_symptom, rels_acompany, rels_category = read_nodes(
@@ -227,17 +180,326 @@ if __name__ == "__main__":
     info(f"3、创建症状、药品完成")
 
     # 4、创建实体关系
-    rels_recommanddrug_nodes = create_relationship('Disease', 'Drug', rels_recommanddrug,
-                                                   'recommand_drug', '好评药品')
-    rels_symptom_nodes = create_relationship('Symptom','Disease', 
-                                             rels_symptom, 'symptom_disease', '症状')
-    info(f"4、创建实体关系 完成")
+    graph_db_utils.ensure_name_indexes(unique_labels)
+    graph_db_utils.ensure_name_indexes(indexed_labels, unique=False)
+    failed = create_edges({
+        'recommanddrug': rels_recommanddrug,
+        'commonddrug': rels_commonddrug,
+        'symptom': rels_symptom,
+        'acompany': rels_acompany,
+    })
+    info(f"4、创建实体关系 完成, 失败 {len(failed)} 条")
+    update_ranking_stats()
     insert_nodes_2_chroma(diseases_nodes,'Disease')
     insert_nodes_2_chroma(symptoms_nodes,'Symptom')
     insert_nodes_2_chroma(drugs_nodes,'Drug')
 
     info(f"5、插入节点到chroma 完成")
-    
-    
-    
-    
+
+    save_entity_matcher()
+    save_manifest(collect_disease_digests(data_path))
+
+
+def incremental_build(manifest):
+    """
+    增量构建：只更新内容哈希发生变化的疾病及其症状、药品关系和向量，并清理孤立节点
+
+    变更疾病的同名节点全部删除后按记录重新创建（与全量构建一样同名疾病各为一个节点），
+    未变更疾病指向变更或新增疾病的并发症关系随之重建。
+    """
+    # 1，比对构建清单
+    previous = manifest['diseases']
+    current = collect_disease_digests(data_path)
+    changed = {name for name, digests in current.items() if previous.get(name) != digests}
+    removed = set(previous) - set(current)
+    info(f"1、比对构建清单: 变更 {len(changed)} 个疾病, 删除 {len(removed)} 个疾病")
+
+    # 2，收集变更疾病的节点和关系，以及其他疾病指向变更疾病的关系
+    disease_rows = []
+    entities = defaultdict(set)
+    edges = defaultdict(list)
+    pending = []
+    for record in iter_medical_records(data_path):
+        if isinstance(record, EdgeRecord):
+            if record.kind in loaded_edge_kinds:
+                pending.append(record)
+        elif isinstance(record, DiseaseRecord):
+            name = record.properties['name']
+            if name in changed:
+                disease_rows.append(disease_properties(record.properties))
+            for edge in pending:
+                start_label, _, end_label, _ = EDGE_KINDS[edge.kind]
+                if name in changed or (end_label == 'Disease' and edge.end in changed):
+                    edges[edge.kind].append([edge.start, edge.end])
+                    entities[start_label].add(edge.start)
+                    entities[end_label].add(edge.end)
+            pending = []
+    info("2、收集变更节点和关系 完成")
+
+    # 3，删除已移除和变更的疾病节点，其关系（包括其他疾病指向它们的关系）一并删除
+    graph_db_utils.delete_nodes_bulk('Disease', removed | changed, batch_size)
+    deleted_uids = [stable_id('Disease', name) for name in removed]
+
+    # 4，重建疾病节点，合并症状、药品节点并写入关系，新建节点写入chroma
+    created = {'Disease': graph_db_utils.create_nodes_bulk('Disease', disease_rows, batch_size)['nodes']}
+    for label in unique_labels:
+        rows = [{'name': name} for name in entities[label]]
+        created[label] = graph_db_utils.merge_nodes_bulk(label, rows, batch_size)['created']
+    failed = create_edges(edges)
+    info(f"4、合并节点和关系 完成, 失败 {len(failed)} 条")
+
+    # 5，清理孤立节点并同步chroma
+    for label in unique_labels:
+        deleted_uids += [stable_id(label, name) for name in graph_db_utils.delete_orphan_nodes(label)['names']]
+    update_ranking_stats()
+    chroma_utils.delete_documents(deleted_uids)
+    for label, nodes in created.items():
+        insert_nodes_2_chroma(nodes, label)
+    info(f"5、同步chroma 完成: 删除 {len(deleted_uids)} 个, 新增 {sum(len(nodes) for nodes in created.values())} 个")
+
+    save_entity_matcher()
+    save_manifest(current)
+
+
+def pipeline_build(writers=4, queue_size=8, drop_schema=False):
+    """
+    流水线全量构建：解析、Neo4j 批量写入、chroma 向量化三个阶段并发执行
+
+    阶段之间用有界队列连接，下游处理不过来时上游阻塞（背压），
+    总耗时趋近于最慢的阶段而不是各阶段之和。
+    关系依赖两端节点，所以在所有节点写完后再由写入线程池并发写入，
+    此时向量化阶段仍在继续消费。
+    """
+    begin = time.perf_counter()
+    graph_db_utils.delete_all_nodes_and_relationships(delete_chunk_size, drop_schema)
+    chroma_utils.clear_documents()
+    graph_db_utils.ensure_name_indexes(unique_labels)
+    graph_db_utils.ensure_name_indexes(indexed_labels, unique=False)
+
+    node_queue = Queue(maxsize=queue_size)
+    embed_queue = Queue(maxsize=queue_size)
+    stop = object()
+
+    def write_nodes():
+        while (item := node_queue.get()) is not stop:
+            label, rows = item
+            result = graph_db_utils.create_nodes_bulk(label, rows, batch_size)
+            embed_queue.put((label, result['nodes']))
+
+    def embed_nodes():
+        while (item := embed_queue.get()) is not stop:
+            label, nodes = item
+            try:
+                insert_nodes_2_chroma(nodes, label)
+            except Exception as e:
+                error(f"插入节点到chroma失败: {label}, {str(e)}")
+        info(f"向量化阶段完成, 耗时 {time.perf_counter() - begin:.1f}s")
+
+    embedder = Thread(target=embed_nodes, name='chroma-embedder')
+    embedder.start()
+    node_writers = [Thread(target=write_nodes, name=f'neo4j-writer-{i}') for i in range(writers)]
+    for writer in node_writers:
+        writer.start()
+
+    # 1，主线程流式解析，节点凑满一批即交给写入线程
+    edges = defaultdict(list)
+    batches = defaultdict(list)
+    for record in iter_medical_records(data_path):
+        if isinstance(record, EdgeRecord):
+            if record.kind in loaded_edge_kinds:
+                edges[record.kind].append([record.start, record.end])
+            continue
+        if isinstance(record, DiseaseRecord):
+            label, row = 'Disease', disease_properties(record.properties)
+        elif record.label in unique_labels:
+            label, row = record.label, {'name': record.name}
+        else:
+            continue
+        batches[label].append(row)
+        if len(batches[label]) >= batch_size:
+            node_queue.put((label, batches.pop(label)))
+    for label, rows in batches.items():
+        node_queue.put((label, rows))
+    info(f"1、解析文档 完成, 耗时 {time.perf_counter() - begin:.1f}s")
+
+    for _ in node_writers:
+        node_queue.put(stop)
+    for writer in node_writers:
+        writer.join()
+    info(f"2、创建节点 完成, 耗时 {time.perf_counter() - begin:.1f}s")
+
+    # 3，节点写完后并发写入关系
+    tasks = []
+    for kind in loaded_edge_kinds:
+        start_label, rel_type, end_label, rel_name = EDGE_KINDS[kind]
+        for start in range(0, len(edges[kind]), batch_size):
+            tasks.append((start_label, end_label, edges[kind][start:start + batch_size], rel_type, rel_name))
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        failed = sum(executor.map(lambda task: create_relationship(*task), tasks), [])
+    info(f"3、创建实体关系 完成, 失败 {len(failed)} 条, 耗时 {time.perf_counter() - begin:.1f}s")
+    update_ranking_stats()
+
+    embed_queue.put(stop)
+    embedder.join()
+    info(f"4、插入节点到chroma 完成, 总耗时 {time.perf_counter() - begin:.1f}s")
+
+    save_entity_matcher()
+    save_manifest(collect_disease_digests(data_path))
+
+
+def export_csv(out_dir):
+    """
+    导出 neo4j-admin database import 可直接加载的带类型表头的CSV
+
+    每个标签一个节点文件、每种关系一个关系文件，节点使用由名称计算的稳定id（uid）；
+    同名疾病合并为一个节点（只保留第一条记录的属性，日志中报告合并的记录数，
+    这一点与逐条建节点的全量构建不同），同一对节点的关系只写一条。同时写出 ids.csv 清单并以 uid 作为id重建chroma
+    （与其他构建方式的向量id一致），导入后的图谱可通过 uid 属性与chroma对应。
+    """
+    begin = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    labels = indexed_labels + unique_labels
+    disease_columns = list(disease_properties(defaultdict(str)))
+    headers = {label: ['uid:ID(' + label + ')', 'name', ':LABEL'] for label in unique_labels}
+    headers['Disease'] = ['uid:ID(Disease)'] + [
+        f"{column}:string[]" if column in disease_array_fields else column
+        for column in disease_columns] + [':LABEL']
+
+    files = {label: open(f"{out_dir}/nodes_{label}.csv", 'w', encoding='utf-8', newline='') for label in labels}
+    writers = {label: csv.writer(f) for label, f in files.items()}
+    for label in labels:
+        writers[label].writerow(headers[label])
+    ids_file = open(f"{out_dir}/ids.csv", 'w', encoding='utf-8', newline='')
+    ids_writer = csv.writer(ids_file)
+    ids_writer.writerow(['uid', 'label', 'name'])
+
+    names = defaultdict(set)
+    edges = defaultdict(list)
+    chroma_nodes = defaultdict(list)
+    collapsed = 0
+    try:
+        for record in iter_medical_records(data_path):
+            if isinstance(record, EdgeRecord):
+                if record.kind in loaded_edge_kinds:
+                    edges[record.kind].append((record.start, record.end))
+                continue
+            if isinstance(record, DiseaseRecord):
+                label, name = 'Disease', record.properties['name']
+                if name in names[label]:
+                    collapsed += 1
+                    continue
+                properties = disease_properties(record.properties)
+                values = [';'.join(properties[column]) if column in disease_array_fields and isinstance(properties[column], list)
+                          else properties[column] for column in disease_columns]
+            elif record.label in unique_labels:
+                label, name = record.label, record.name
+                values = [name]
+            else:
+                continue
+            uid = stable_id(label, name)
+            names[label].add(name)
+            writers[label].writerow([uid] + values + [label])
+            ids_writer.writerow([uid, label, name])
+            chroma_nodes[label].append(Node(id=uid, labels=[label], properties={'name': name}))
+    finally:
+        for f in files.values():
+            f.close()
+        ids_file.close()
+
+    relationship_files = []
+    skipped = 0
+    duplicates = 0
+    for kind in loaded_edge_kinds:
+        start_label, rel_type, end_label, rel_name = EDGE_KINDS[kind]
+        path = f"{out_dir}/rels_{kind}.csv"
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([f":START_ID({start_label})", f":END_ID({end_label})", 'name', ':TYPE'])
+            # 与 MERGE 写入一致，同一对节点只建一条关系，避免导入后出现平行的重复关系
+            seen = set()
+            for start, end in edges[kind]:
+                if (start, end) in seen:
+                    duplicates += 1
+                elif start in names[start_label] and end in names[end_label]:
+                    seen.add((start, end))
+                    writer.writerow([stable_id(start_label, start), stable_id(end_label, end), rel_name, rel_type])
+                else:
+                    skipped += 1
+        relationship_files.append(path)
+    info(f"1、导出CSV 完成: {sum(len(v) for v in names.values())} 个节点, 合并同名疾病记录 {collapsed} 条, "
+         f"跳过重复关系 {duplicates} 条, 跳过缺少端点的关系 {skipped} 条, 耗时 {time.perf_counter() - begin:.1f}s")
+
+    chroma_utils.clear_documents()
+    for label, nodes in chroma_nodes.items():
+        insert_nodes_2_chroma(nodes, label)
+    info("2、以uid插入节点到chroma 完成")
+
+    save_entity_matcher()
+    manifest = save_manifest(collect_disease_digests(data_path))
+    with open(f"{out_dir}/manifest.json", 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': manifest['version'],
+            'id_property': 'uid',
+            'ids': f"{out_dir}/ids.csv",
+            'nodes': {label: f"{out_dir}/nodes_{label}.csv" for label in labels},
+            'relationships': relationship_files,
+        }, f, ensure_ascii=False, indent=2)
+
+    command = ' '.join(['neo4j-admin database import full', graph_db_utils.database, '--overwrite-destination',
+                        '--multiline-fields=true']
+                       + [f"--nodes={label}={out_dir}/nodes_{label}.csv" for label in labels]
+                       + [f"--relationships={path}" for path in relationship_files])
+    info(f"3、导入命令: {command}")
+    info("   导入后执行 python create_graph.py --ranking-stats 计算排序统计")
+
+
+def main():
+    global graph_db_utils, chroma_utils
+    parser = argparse.ArgumentParser(description='构建医疗知识图谱和向量数据库')
+    parser.add_argument('--incremental', action='store_true',
+                        help='只更新与上次构建清单相比发生变化的疾病')
+    parser.add_argument('--drop-schema', action='store_true',
+                        help='全量构建清空数据库时先删除索引和约束，清空后重建')
+    parser.add_argument('--export-csv', metavar='DIR',
+                        help='不写数据库，导出 neo4j-admin 批量导入用的CSV到DIR')
+    parser.add_argument('--embed-workers', type=int, default=int(os.getenv('EMBEDDING_WORKERS', 1)),
+                        help='向chroma写入时并行编码的进程数，1 表示不启用多进程')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='全量构建时解析、写图谱、向量化三个阶段并发执行')
+    parser.add_argument('--writers', type=int, default=int(os.getenv('INGEST_WRITERS', 4)),
+                        help='流水线中 Neo4j 批量写入线程数')
+    parser.add_argument('--queue-size', type=int, default=int(os.getenv('INGEST_QUEUE_SIZE', 8)),
+                        help='流水线阶段之间有界队列的容量（批数）')
+    parser.add_argument('--ranking-stats', action='store_true',
+                        help='只为已有图谱重新计算症状权重和疾病症状数（如 neo4j-admin 导入之后）')
+    args = parser.parse_args()
+
+    graph_db_utils = Neo4jUtils()
+    chroma_utils = ChromeUtils()
+    chroma_utils.start_embedding_pool(args.embed_workers)
+    manifest = load_manifest() if args.incremental else None
+    if manifest and manifest.get('chroma_ids') != 'uid':
+        info(f"构建清单 {manifest_path} 的向量id规则已过期，执行全量构建")
+        manifest = None
+    if args.ranking_stats:
+        update_ranking_stats()
+        # 排序结果变化，发布新版本使查询缓存和图索引失效
+        previous = load_manifest()
+        if previous:
+            save_manifest(previous['diseases'])
+    elif args.export_csv:
+        export_csv(args.export_csv)
+    elif manifest:
+        incremental_build(manifest)
+    else:
+        if args.incremental and not os.path.exists(manifest_path):
+            info(f"未找到构建清单 {manifest_path}，执行全量构建")
+        if args.pipeline:
+            pipeline_build(args.writers, args.queue_size, args.drop_schema)
+        else:
+            full_build(args.drop_schema)
+    chroma_utils.stop_embedding_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,129 @@
+import os
+import time
+
+from utils.graph_index_utils import GraphIndex
+from utils.graph_query_utils import complication_hops, diagnosis_query, result_cache, summary_fields
 from utils.logger_utils import info
+from utils.medical_utils import DISEASE_DEGREE_PROPERTY, SYMPTOM_WEIGHT_PROPERTY
 from utils.neo4j_utils import Neo4jUtils
-from collections import defaultdict
 
 
 graph_db_utils = Neo4jUtils()
 
+# 可选的进程内CSR索引，开启后症状->疾病、疾病->药品的打分不再访问数据库
+graph_index = GraphIndex(
+    graph_db_utils,
+    os.getenv('GRAPH_MANIFEST_PATH', os.getcwd() + '/.graph_manifest.json'),
+    os.getenv('GRAPH_INDEX_PATH', os.getcwd() + '/.graph_index.npz'),
+    summary_fields) if os.getenv('GRAPH_INDEX_ENABLED', 'false').lower() == 'true' else None
+
 
-def query_disease_by_symptom(symptoms):
+@result_cache.memoize
+def query_disease_by_symptom(symptoms, top_k=3):
     """
-    根据症状查询疾病 - 使用defaultdict消除特殊情况
+    根据症状查询疾病 - 在数据库中按症状特异性权重之和排序（常见症状权重低），一次往返只取前top_k个
     """
-    diseases_info = defaultdict(lambda: {"count": 0, "properties": {}})
+    if graph_index:
+        sorted_diseases = [(name, {"count": count, "score": score, "properties": graph_index.properties.get(name, {})})
+                           for name, count, score in graph_index.top_k("symptom_disease", symptoms, top_k)]
+        return sorted_diseases,[disease[0] for disease in sorted_diseases]
     
-    for symptom in symptoms:
-        relationships = graph_db_utils.find_node_by_relationship(
-            relationship_type="symptom_disease", front_node_name=symptom)
-        if relationships['success']:
-            for node in relationships['nodes']:
-                disease_name = node.properties['name']
-                diseases_info[disease_name]["count"] += 1
-                diseases_info[disease_name]["properties"] = node.properties
-                # info(f"症状:{symptom} 疾病:{disease_name}")
+    result = graph_db_utils.rank_related_nodes(
+        "Symptom", symptoms, "symptom_disease", "Disease", top_k,
+        weight_property=SYMPTOM_WEIGHT_PROPERTY, degree_property=DISEASE_DEGREE_PROPERTY)
+    if not result['success']:
+        return [], []
     
-    # 根据count值从大到小排序，返回前3个疾病名称
-    sorted_diseases = sorted(diseases_info.items(), key=lambda x: x[1]["count"], reverse=True)
-    return sorted_diseases,[disease[0] for disease in sorted_diseases[:3]]
+    sorted_diseases = [(record['name'], {"count": record['count'], "score": record['score'],
+                                         "properties": record['properties']})
+                       for record in result['records']]
+    return sorted_diseases,[disease[0] for disease in sorted_diseases]
       
-def query_drug_by_disease(diseases):
+@result_cache.memoize
+def query_drug_by_disease(diseases, top_k=3):
+    """
+    根据疾病查询药品 - 在数据库中聚合命中次数并排序，一次往返只取前top_k个
+    """
+    if graph_index:
+        return [name for name, _, _ in graph_index.top_k("recommand_drug", diseases, top_k)]
+    
+    result = graph_db_utils.rank_related_nodes(
+        "Disease", diseases, "recommand_drug", "Drug", top_k, with_properties=False)
+    if not result['success']:
+        return []
+    
+    return [record['name'] for record in result['records']]
+
+@result_cache.memoize
+def query_diagnosis_by_symptom(symptoms, top_k=3, drug_k=3):
+    """
+    根据症状一次查询出诊断所需的全部上下文 - 排名前top_k的疾病、
+    其排名前drug_k的推荐药品，以及llm_summary需要的疾病字段
+    """
+    if graph_index:
+        sorted_diseases, disease_names = query_disease_by_symptom(symptoms, top_k)
+        return sorted_diseases, disease_names, query_drug_by_disease(disease_names, drug_k)
+    
+    result = graph_db_utils.run_cypher(
+        diagnosis_query, {"symptoms": list(symptoms), "top_k": top_k, "drug_k": drug_k}, write=False)
+    if not result['success'] or not result['records']:
+        return [], [], []
+    
+    record = result['records'][0]
+    sorted_diseases = [(disease['name'], {"count": disease['count'], "score": disease['score'],
+                                          "properties": disease['properties']})
+                       for disease in record['diseases']]
+    return sorted_diseases, [disease[0] for disease in sorted_diseases], record['drugs']
+
+
+@result_cache.memoize
+def query_complications_by_symptom(symptoms, disease_k=3, complication_k=5, drug_k=5):
     """
-    根据疾病查询药品 - 使用defaultdict消除特殊情况
+    根据症状一次查询出 疾病、其并发症、并发症的用药，每一跳只保留命中次数最多的若干个
+    
+    Returns:
+        tuple: (疾病名称列表, 并发症列表, 药品名称列表)，并发症每项为 {'name', 'count', 'sources'}
+    """
+    result = graph_db_utils.traverse("Symptom", symptoms, complication_hops(disease_k, complication_k, drug_k))
+    if not result['success']:
+        return [], [], []
+    
+    diseases, complications, drugs = result['hops']
+    return ([disease['name'] for disease in diseases],
+            [{'name': node['name'], 'count': node['count'], 'sources': node['sources']} for node in complications],
+            [drug['name'] for drug in drugs])
+
+
+def compare_latency(symptoms, rounds=20):
+    """
+    对比 两步查询(症状->疾病, 疾病->药品) 与 一次融合查询 的平均延迟
+    
+    未缓存的延迟在绕过结果缓存时测量，缓存命中的延迟在预热一次后测量，两者分别报告
     """
-    drugs_info = defaultdict(lambda: {"count": 0, "properties": {}})
+    def two_step():
+        _, disease_names = query_disease_by_symptom(symptoms)
+        query_drug_by_disease(disease_names)
     
-    for disease in diseases:
-        relationships = graph_db_utils.find_node_by_relationship(
-            relationship_type="recommand_drug", front_node_name=disease)
-        if relationships['success']:
-            for node in relationships['nodes']:
-                drug_name = node.properties['name']
-                drugs_info[drug_name]["count"] += 1
-                drugs_info[drug_name]["properties"] = node.properties
-                # info(f"疾病:{disease} 药品:{drug_name}")
+    def fused():
+        query_diagnosis_by_symptom(symptoms)
     
-    # 根据count值从大到小排序，返回前3个药品名称
-    sorted_drugs = sorted(drugs_info.items(), key=lambda x: x[1]["count"], reverse=True)
-    return [drug[0] for drug in sorted_drugs[:3]]
+    def average(fn):
+        begin = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        return (time.perf_counter() - begin) / rounds * 1000
+    
+    with result_cache.bypass():
+        uncached = {'two_step': average(two_step), 'fused': average(fused)}
+    two_step()
+    fused()
+    cached = {'two_step': average(two_step), 'fused': average(fused)}
+    
+    info(f"未缓存: 两步查询平均 {uncached['two_step']:.1f}ms, 融合查询平均 {uncached['fused']:.1f}ms, "
+         f"加速比 {uncached['two_step'] / uncached['fused']:.2f}")
+    info(f"缓存命中: 两步查询平均 {cached['two_step']:.3f}ms, 融合查询平均 {cached['fused']:.3f}ms")
+    info(f"结果缓存指标: {result_cache.metrics()}")
+    return uncached, cached
 
 if __name__ == "__main__":
     diseases,disease_names = query_disease_by_symptom(["流鼻涕","咽痛","头痛"])
@@ -52,7 +131,7 @@ if __name__ == "__main__":
     info(f"疾病名称: {disease_names}")
     drug_names = query_drug_by_disease(disease_names)
     info(f"药品名称: {drug_names}")
-    
-    
-    
-    
+    compare_latency(["流鼻涕","咽痛","头痛"])
+    _, complications, complication_drugs = query_complications_by_symptom(["流鼻涕","咽痛","头痛"])
+    info(f"并发症: {[node['name'] for node in complications]}")
+    info(f"并发症用药: {complication_drugs}")
@@ -1,11 +1,70 @@
 import json
+import os
+import sys
+import time
 from utils.chroma_utils import ChromeUtils
+from utils.entity_matcher_utils import EntityMatcher
 from utils.llm_utils import query_llm
-from utils.logger_utils import info
+from utils.logger_utils import info, error
 
 chroma_utils = ChromeUtils()
+# 构建图谱时生成的实体名称自动机，精确命中的实体不再走向量检索
+entity_matcher = EntityMatcher.load(
+    os.getenv('ENTITY_MATCHER_PATH', os.getcwd() + '/.entity_matcher.pkl'),
+    float(os.getenv('ENTITY_MATCH_MIN_COVERAGE', 0.8)),
+    # 名称属于多个标签时的归类优先级，逗号分隔
+    [label.strip() for label in os.getenv('ENTITY_LABEL_PRIORITY', 'Symptom,Disease,Drug').split(',')])
+# 实体抽取方式: llm 调用大模型; local 自动机词典匹配; hybrid 本地抽取不到实体时才调用大模型
+extraction_mode = os.getenv('ENTITY_EXTRACTION_MODE', 'llm')
+# 本地抽取时按关键词判断关系
+relation_keywords = {
+    'recommand_drug': ['药', '吃什么', '用什么', '怎么治', '如何治', '治疗'],
+    'symptom_disease': ['什么病', '怎么回事', '什么原因', '哪些病', '病因'],
+}
 
-def extract_entity_from_question(question):
+def extract_entity_from_question(question, mode=None):
+    """
+    从问题中提取实体和关系
+    
+    Args:
+        question (str): 用户问题
+        mode (str, optional): llm / local / hybrid，默认取 ENTITY_EXTRACTION_MODE
+        
+    Returns:
+        str: {"Disease":[], "Symptom":[], "Drug":[], "relationship":[]} 格式的json字符串
+        
+    Raises:
+        RuntimeError: local 模式下没有可用的实体自动机
+    """
+    mode = mode or extraction_mode
+    if mode == 'llm':
+        return extract_entity_with_llm(question)
+    if not entity_matcher:
+        if mode == 'local':
+            raise RuntimeError("未加载实体自动机，无法本地抽取实体，请先运行 create_graph.py 生成")
+        error("未加载实体自动机，hybrid 模式全部改用大模型抽取")
+        return extract_entity_with_llm(question)
+    
+    data = extract_entity_locally(question)
+    if mode == 'hybrid' and not (data['Disease'] or data['Symptom'] or data['Drug']):
+        info("本地未抽取到实体，改用大模型抽取")
+        return extract_entity_with_llm(question)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def extract_entity_locally(question):
+    """用实体名称自动机扫描问题，关系按关键词规则判断"""
+    data = entity_matcher.extract(question)
+    relationship = [relation for relation, keywords in relation_keywords.items()
+                    if any(keyword in question for keyword in keywords)]
+    # 提到症状默认是在问可能的疾病
+    if data['Symptom'] and 'symptom_disease' not in relationship:
+        relationship.append('symptom_disease')
+    data['relationship'] = relationship
+    return data
+
+
+def extract_entity_with_llm(question):
     system_prompt = """
     你是一个具有多年问诊经验的西医医生，具有丰富的西医知识，能够根据问题，提取出问题中的实体和关系。
     实体有可能是疾病Disease、症状Symptom、药品Drug。
@@ -43,33 +102,114 @@ def extract_entity_from_question(question):
     
 #     return results
 
+def resolve_entities(data):
+    """
+    先用自动机精确匹配，只把未命中的实体交给向量检索
+    
+    Returns:
+        dict: 标签 -> {实体文本: 图谱实体名称列表}
+    """
+    labels = ["Disease", "Symptom", "Drug"]
+    results = {label: {} for label in labels}
+    unresolved = {label: [] for label in labels}
+    for label in labels:
+        for entity in data[label]:
+            name = entity_matcher.lookup(entity, label) if entity_matcher and entity else None
+            if name is None:
+                unresolved[label].append(entity)
+            else:
+                results[label][entity] = [name]
+    
+    # 未命中的实体一次编码，每种标签一次检索
+    count = sum(len(set(entity for entity in entities if entity)) for entities in unresolved.values())
+    if count:
+        begin = time.perf_counter()
+        for label, documents in chroma_utils.query_documents(unresolved, 1).items():
+            results[label].update(documents)
+        if entity_matcher:
+            entity_matcher.record_fallback(count, time.perf_counter() - begin)
+    return results
+
+
 def query_data_from_chroma(data):
+    results = resolve_entities(data)
     # 1, 查询疾病
     diseases = []
     symptoms = []
     drugs = []
     if data['Disease']:
-       for disease in data['Disease']:             
-           result = chroma_utils.query_document(disease,"Disease",1)
-           diseases.extend(result['documents'][0])
+       for disease in data['Disease']:
+           diseases.extend(results['Disease'].get(disease, []))
        info(f"向量检索得到疾病:{diseases}")
        
     if data['Symptom']:
-       for symptom in data['Symptom']:             
-           result = chroma_utils.query_document(symptom,"Symptom",1)
-           symptoms.extend(result['documents'][0])
+       for symptom in data['Symptom']:
+           symptoms.extend(results['Symptom'].get(symptom, []))
        info(f"向量检索得到症状:{symptoms}")
        
     if data['Drug']:
-       for drug in data['Drug']:             
-           result = chroma_utils.query_document(drug,"Drug",1)
-           drugs.extend(result['documents'][0])
+       for drug in data['Drug']:
+           drugs.extend(results['Drug'].get(drug, []))
        info(f"向量检索得到药品:{drugs}")
+    if entity_matcher:
+        entity_matcher.report()
     
     return diseases,symptoms,drugs
 
 
+def benchmark_extraction(labeled_path):
+    """
+    对比本地抽取与大模型抽取的延迟和准确度
+    
+    labeled_path 为 jsonl 文件，每行 {"question": str, "Disease": [], "Symptom": [], "Drug": []}，
+    准确度按 (标签, 实体) 对计算 F1，并统计两种方式抽取结果完全一致的比例
+    """
+    def entity_pairs(data):
+        return {(label, name) for label in ("Disease", "Symptom", "Drug") for name in data.get(label, []) if name}
+
+    def f1(predicted, expected):
+        if not predicted and not expected:
+            return 1.0
+        correct = len(predicted & expected)
+        return 2 * correct / (len(predicted) + len(expected))
+
+    if not entity_matcher:
+        error("未加载实体自动机，无法对比本地抽取")
+        return None
+    with open(labeled_path, encoding='utf-8') as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    if not samples:
+        return None
+    
+    stats = {mode: {'seconds': [], 'f1': []} for mode in ('local', 'llm')}
+    agreements = 0
+    for sample in samples:
+        predictions = {}
+        for mode in ('local', 'llm'):
+            begin = time.perf_counter()
+            try:
+                predictions[mode] = entity_pairs(json.loads(extract_entity_from_question(sample['question'], mode)))
+            except Exception as e:
+                info(f"{mode} 抽取失败: {sample['question']}: {str(e)}")
+                predictions[mode] = set()
+            stats[mode]['seconds'].append(time.perf_counter() - begin)
+            stats[mode]['f1'].append(f1(predictions[mode], entity_pairs(sample)))
+        agreements += predictions['local'] == predictions['llm']
+    
+    for mode, stat in stats.items():
+        seconds = sorted(stat['seconds'])
+        info(f"{mode} 抽取: {len(samples)} 个问题, 平均 {sum(seconds) / len(seconds) * 1000:.1f}ms, "
+             f"P95 {seconds[int(len(seconds) * 0.95)] * 1000:.1f}ms, 平均F1 {sum(stat['f1']) / len(stat['f1']):.3f}")
+    info(f"本地与大模型抽取结果一致的比例: {agreements / len(samples):.1%}")
+    return stats
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # 抽取基准测试: python question_parser.py data/extraction_benchmark.jsonl
+        benchmark_extraction(sys.argv[1])
+        sys.exit(0)
+    
 #     question = "感冒吃什么药?"
 #     data = extract_entity_from_question(question)
 #     info(f"提取到的实体和关系:{data}\n")
@@ -0,0 +1,240 @@
+from neo4j import AsyncGraphDatabase, unit_of_work as managed_transaction
+import os
+import time
+from dotenv import load_dotenv
+from utils.logger_utils import info, error
+from utils.neo4j_utils import QueryCondition, apply_relationship_labels, build_condition_query, build_create_nodes_query, \
+    build_merge_edges_query, build_rank_query, build_traversal_query, infer_relationship_labels, records_to_graph, \
+    schema_relationship_labels, Node
+
+load_dotenv()
+
+
+class AsyncNeo4jUtils:
+    """
+    Neo4j数据库异步操作工具类
+
+    基于 neo4j 异步驱动，与 Neo4jUtils 共用查询构建逻辑和返回格式，
+    单个事件循环即可同时处理大量并发查询，不需要为每个查询占用一个线程。
+    """
+
+    def __init__(self):
+        """
+        初始化Neo4j异步连接
+
+        连接配置与 Neo4jUtils 相同，均从环境变量读取
+        """
+        self.uri = os.getenv('NEO4J_URI', 'bolt://localhost:7687')
+        self.username = os.getenv('NEO4J_USERNAME', 'neo4j')
+        self.password = os.getenv('NEO4J_PASSWORD', 'password')
+        self.database = os.getenv('NEO4J_DATABASE', 'neo4j')
+        self.max_pool_size = int(os.getenv('NEO4J_MAX_POOL_SIZE', 100))
+        # 多跳遍历的限制，与 Neo4jUtils 相同
+        self.max_traversal_depth = int(os.getenv('NEO4J_MAX_TRAVERSAL_DEPTH', 4))
+        self.max_traversal_fanout = int(os.getenv('NEO4J_MAX_TRAVERSAL_FANOUT', 100))
+        self.traversal_timeout = float(os.getenv('NEO4J_TRAVERSAL_TIMEOUT', 5))
+        self._run_traversal = managed_transaction(timeout=self.traversal_timeout)(self._run)
+        # 关系类型 -> (起点标签, 终点标签)
+        self._labels_by_relationship = {}
+
+        try:
+            self.driver = AsyncGraphDatabase.driver(
+                self.uri,
+                auth=(self.username, self.password),
+                max_connection_pool_size=self.max_pool_size,
+                connection_acquisition_timeout=float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', 60)),
+                fetch_size=int(os.getenv('NEO4J_FETCH_SIZE', 1000))
+            )
+            info(f"Neo4j异步连接已建立: {self.uri}, 连接池 {self.max_pool_size}")
+        except Exception as e:
+            error(f"Neo4j异步连接失败: {str(e)}")
+            raise
+
+    @staticmethod
+    async def _run(tx, query, parameters=None):
+        """事务函数：执行查询并在事务内取回全部记录"""
+        result = await tx.run(query, parameters or {})
+        return [record async for record in result]
+
+    async def _read(self, query, parameters=None):
+        async with self.driver.session(database=self.database) as session:
+            return await session.execute_read(self._run, query, parameters)
+
+    async def _write(self, query, parameters=None):
+        async with self.driver.session(database=self.database) as session:
+            return await session.execute_write(self._run, query, parameters)
+
+    async def run_cypher(self, query, parameters=None, write=True):
+        """
+        执行自定义Cypher查询
+
+        Args:
+            query (str): Cypher查询语句
+            parameters (dict, optional): 查询参数
+            write (bool): 是否为写操作，默认使用写事务；只读查询传 False
+
+        Returns:
+            dict: 包含查询结果的字典
+        """
+        try:
+            if write:
+                result = await self._write(query, parameters)
+            else:
+                result = await self._read(query, parameters)
+            records = [dict(record) for record in result]
+            return {'success': True, 'records': records}
+        except Exception as e:
+            error(f"执行Cypher查询失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    async def find_nodes_by_condition(self, source_condition, relationship_condition=None, target_condition=None,
+                                      returns=("a", "r", "b"), raw=False):
+        """
+        统一的节点查询方法，参数与返回值同 Neo4jUtils.find_nodes_by_condition
+        """
+        try:
+            if relationship_condition and relationship_condition.relationship_type:
+                source_condition, target_condition = apply_relationship_labels(
+                    source_condition, relationship_condition, target_condition,
+                    *await self._relationship_labels(relationship_condition.relationship_type))
+            query, params = build_condition_query(
+                source_condition, relationship_condition, target_condition, returns)
+            records = await self._read(query, params)
+            if raw:
+                return {'success': True, 'rows': records}
+            nodes, relationships = records_to_graph(records, returns)
+            return {'success': True, 'nodes': nodes, 'relationships': relationships}
+        except Exception as e:
+            error(f"查询节点失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    async def _relationship_labels(self, relationship_type):
+        """推断关系两端的节点标签，同 Neo4jUtils._relationship_labels"""
+        labels = schema_relationship_labels(relationship_type)
+        if labels is not None:
+            return labels
+        if relationship_type not in self._labels_by_relationship:
+            records = await self._read(
+                f"MATCH (a)-[:{relationship_type}]->(b) RETURN DISTINCT labels(a) AS start, labels(b) AS end LIMIT 2")
+            if not records:
+                return None, None
+            self._labels_by_relationship[relationship_type] = infer_relationship_labels(records)
+        return self._labels_by_relationship[relationship_type]
+
+    async def find_node_by_relationship(self, relationship_type, front_node_name, front_node_label=None,
+                                        properties=None):
+        """
+        根据关系类型和属性查找节点，参数与返回值同 Neo4jUtils.find_node_by_relationship
+        """
+        source_condition = QueryCondition(label=front_node_label, properties={"name": front_node_name})
+        relationship_condition = QueryCondition(relationship_type=relationship_type, direction="outgoing")
+        target_condition = QueryCondition(return_properties=properties)
+
+        result = await self.find_nodes_by_condition(
+            source_condition, relationship_condition, target_condition, returns=("b",))
+        if not result['success']:
+            return result
+        return {'success': True, 'nodes': result['nodes']}
+
+    async def rank_related_nodes(self, from_label, names, relationship_type, to_label, limit, with_properties=True,
+                                 weight_property=None, degree_property=None):
+        """
+        按关联次数排序的邻居节点查询，参数与返回值同 Neo4jUtils.rank_related_nodes
+        """
+        query = build_rank_query(from_label, relationship_type, to_label, with_properties,
+                                 weight_property, degree_property)
+        try:
+            records = [record.data() for record in await self._read(
+                query, {'names': list(names), 'limit': limit})]
+            return {'success': True, 'records': records}
+        except Exception as e:
+            error(f"查询关联节点排名失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    async def traverse(self, start_label, names, hops):
+        """
+        有界的多跳遍历，参数与返回值同 Neo4jUtils.traverse
+        """
+        if not hops or len(hops) > self.max_traversal_depth:
+            error(f"遍历跳数 {len(hops)} 超出范围 1~{self.max_traversal_depth}")
+            return {'success': False, 'error': f"遍历跳数需在 1~{self.max_traversal_depth} 之间"}
+
+        query = build_traversal_query(start_label, hops)
+        params = {'names': list(names)}
+        for i, hop in enumerate(hops, 1):
+            params[f"limit{i}"] = min(hop.limit, self.max_traversal_fanout)
+        try:
+            async with self.driver.session(database=self.database) as session:
+                records = await session.execute_read(self._run_traversal, query, params)
+            record = records[0]
+            return {'success': True, 'hops': [record[f"hop{i}"] for i in range(1, len(hops) + 1)]}
+        except Exception as e:
+            error(f"多跳遍历失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    async def create_nodes_bulk(self, label, rows, batch_size=1000):
+        """
+        批量创建节点，参数与返回值同 Neo4jUtils.create_nodes_bulk
+        """
+        rows = list(rows)
+        query = build_create_nodes_query(label)
+        nodes = []
+        try:
+            async with self.driver.session(database=self.database) as session:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    begin = time.perf_counter()
+                    records = await session.execute_write(self._run, query, {'rows': batch})
+                    info(f"批量写入 {label}: 第 {start // batch_size + 1} 批 {len(batch)} 条, "
+                         f"耗时 {time.perf_counter() - begin:.3f}s")
+                    for record, properties in zip(records, batch):
+                        nodes.append(Node(id=record['id'], labels=[label], properties=properties))
+            return {'success': True, 'nodes': nodes}
+        except Exception as e:
+            error(f"批量创建节点失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'nodes': nodes}
+
+    async def create_relationships_bulk(self, from_label, relationship_type, to_label, edges,
+                                        properties=None, batch_size=1000):
+        """
+        批量创建关系，参数与返回值同 Neo4jUtils.create_relationships_bulk
+        """
+        edges = list(edges)
+        query = build_merge_edges_query(from_label, relationship_type, to_label)
+        created = 0
+        failed = []
+        processed = 0
+        try:
+            async with self.driver.session(database=self.database) as session:
+                for start in range(0, len(edges), batch_size):
+                    batch = [list(edge) for edge in edges[start:start + batch_size]]
+                    processed = start + len(batch)
+                    try:
+                        records = await session.execute_write(
+                            self._run, query, {'rows': batch, 'properties': properties or {}})
+                    except Exception as e:
+                        failed.extend({'edge': edge, 'error': str(e)} for edge in batch)
+                        continue
+                    for record in records:
+                        if record['ok']:
+                            created += 1
+                        else:
+                            failed.append({'edge': record['row'], 'error': '未找到匹配的节点'})
+        except Exception as e:
+            failed.extend({'edge': list(edge), 'error': str(e)} for edge in edges[processed:])
+
+        if failed:
+            error(f"批量创建关系 {relationship_type}: {len(failed)} 条失败")
+        info(f"批量创建关系 {relationship_type}: 成功 {created} 条")
+        return {'success': not failed, 'created': created, 'failed': failed}
+
+    async def close(self):
+        """
+        关闭数据库连接
+        """
+        try:
+            if self.driver:
+                await self.driver.close()
+                info("Neo4j异步连接已关闭")
+        except Exception as e:
+            error(f"关闭Neo4j异步连接失败: {str(e)}")
@@ -1,31 +1,343 @@
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 import chromadb
+import numpy as np
 import os
+import random
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
 from dotenv import load_dotenv
+from utils.embedding_cache_utils import EmbeddingCache
+from utils.embedding_pool_utils import EmbeddingPool
+from utils.logger_utils import info, error
 load_dotenv()
 
+# 实体标签，按标签分collection时每个标签一个collection
+LABELS = ['Disease', 'Symptom', 'Drug']
+
+
+def hnsw_configuration(label=None):
+    """
+    标签对应collection的HNSW参数，CHROMA_HNSW_<参数>_<标签> 优先于 CHROMA_HNSW_<参数>
+
+    M、ef_construction 只在创建collection时生效，ef_search 可随时调整；label 为空时只读通用参数
+    """
+    def param(name, default):
+        value = os.getenv(f"CHROMA_HNSW_{name}", default)
+        return int(os.getenv(f"CHROMA_HNSW_{name}_{label.upper()}", value) if label else value)
+
+    return {
+        "space": "l2",
+        "max_neighbors": param("M", 16),
+        "ef_construction": param("EF_CONSTRUCTION", 100),
+        "ef_search": param("EF_SEARCH", 100),
+    }
+
 
 class ChromeUtils:
     def __init__(self):
         model_path = os.getenv("LOCAL_MODEL_PATH", None)
+        self.model_path = model_path
         chroma_path = os.getcwd() + f'/.{os.getenv("CHROME_LOCAL_PATH")}'
         # 使用中文 embedding 模型
         self.emb_fn = SentenceTransformerEmbeddingFunction(model_path)
+        # 按 (模型, 文本) 持久化缓存向量，重建时未变化的文本不再重新编码
+        cache_path = os.getcwd() + f'/.{os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache")}'
+        self.embedding_cache = EmbeddingCache(cache_path, model_path)
+        self.embedding_pool = None
+        # 查询文本向量的进程内 LRU，重复出现的实体不再经过模型和磁盘缓存
+        self.query_cache_size = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 4096))
+        self.query_cache = OrderedDict()
+        self.query_cache_lock = threading.Lock()
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
         self.client = chromadb.PersistentClient(path=chroma_path)
+        # 所有标签共用、查询时按 label 过滤的旧collection
         self.collection = self.client.get_or_create_collection(
             name="example",
             embedding_function=self.emb_fn
         )
+        # 默认每个标签一个collection，HNSW只在同标签的实体中搜索，不再先搜后过滤
+        self.per_label = os.getenv("CHROMA_COLLECTION_MODE", "per_label") == "per_label"
+        self.collections = {label: self._label_collection(label) for label in LABELS} if self.per_label else {}
+        self.query_per_label = self.per_label
+        if self.per_label and self.collection.count() and not any(c.count() for c in self.collections.values()):
+            info("按标签的collection为空，查询暂时使用旧collection，"
+                 "执行 python -m utils.chroma_utils migrate 迁移已有向量")
+            self.query_per_label = False
 
-    def add_document(self, document, metadata,ids):
-        self.collection.add(
-            documents=document,
-            metadatas=metadata,
-            ids=ids
+    def _label_collection(self, label):
+        configuration = hnsw_configuration(label)
+        collection = self.client.get_or_create_collection(
+            name=f"{os.getenv('CHROMA_COLLECTION_PREFIX', 'entity')}_{label.lower()}",
+            embedding_function=self.emb_fn,
+            configuration={"hnsw": configuration}
         )
+        try:
+            # 已存在的collection沿用创建时的 M、ef_construction，只更新 ef_search
+            collection.modify(configuration={"hnsw": {"ef_search": configuration["ef_search"]}})
+        except Exception as e:
+            error(f"更新 {label} collection 的 ef_search 失败: {str(e)}")
+        return collection
+
+    def collection_for(self, label):
+        """
+        Returns:
+            tuple: (collection, 查询时的 where 条件)
+        """
+        if self.query_per_label:
+            return self.collections[label], None
+        return self.collection, {"label": label}
+
+    def add_document(self, document, metadata,ids):
+        """写入单条或多条文档，与 add_documents_bulk 一样按 metadata 中的 label 写入对应的collection"""
+        if isinstance(document, str):
+            document, metadata, ids = [document], [metadata], [ids]
+        self.add_documents_bulk(document, metadata, ids)
+
+    def start_embedding_pool(self, workers):
+        # 多进程编码只用于构建阶段的批量写入，查询仍在本进程编码
+        if workers > 1:
+            self.embedding_pool = EmbeddingPool(self.model_path, workers)
+
+    def stop_embedding_pool(self):
+        if self.embedding_pool:
+            self.embedding_pool.close()
+            self.embedding_pool = None
+
+    def embed(self, texts, bulk=False):
+        """bulk 为构建时批量写入：可用多进程编码，并把新向量写入持久缓存；否则只读缓存"""
+        encode_fn = self.embedding_pool if bulk and self.embedding_pool else self.emb_fn
+        return self.embedding_cache.encode(texts, encode_fn, persist=bulk)
+
+    @staticmethod
+    def normalize_query(text):
+        return unicodedata.normalize('NFKC', text).strip()
+
+    def embed_queries(self, texts):
+        """
+        查询文本编码：按规范化后的文本查 LRU，未命中的文本先查构建时的持久缓存（只读）再编码，
+        结果只进入进程内 LRU
+
+        Returns:
+            list: 与 texts 对齐的向量
+        """
+        keys = [self.normalize_query(text) for text in texts]
+        vectors = {}
+        with self.query_cache_lock:
+            for key in keys:
+                if key in vectors:
+                    continue
+                vector = self.query_cache.get(key)
+                if vector is not None:
+                    self.query_cache.move_to_end(key)
+                    vectors[key] = vector
+            self.query_cache_hits += sum(1 for key in keys if key in vectors)
+            self.query_cache_misses += sum(1 for key in keys if key not in vectors)
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+        if missing:
+            encoded = self.embed(missing)
+            with self.query_cache_lock:
+                for key, vector in zip(missing, encoded):
+                    vectors[key] = vector
+                    self.query_cache[key] = vector
+                    self.query_cache.move_to_end(key)
+                while len(self.query_cache) > self.query_cache_size:
+                    self.query_cache.popitem(last=False)
+        return [vectors[key] for key in keys]
+
+    def query_cache_stats(self):
+        total = self.query_cache_hits + self.query_cache_misses
+        return {
+            'hits': self.query_cache_hits,
+            'misses': self.query_cache_misses,
+            'hit_rate': self.query_cache_hits / total if total else 0.0,
+            'size': len(self.query_cache),
+        }
+
+    def add_documents_bulk(self, documents, metadatas, ids, batch_size=None):
+        batch_size = batch_size or int(os.getenv("CHROMA_BATCH_SIZE", 512))
+        batch_size = min(batch_size, self.client.get_max_batch_size())
+        # 按标签写入各自的collection
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            label = metadata.get("label") if self.per_label else None
+            groups.setdefault(label if label in self.collections else None, []).append(i)
+        for label, indices in groups.items():
+            collection = self.collections[label] if label else self.collection
+            self._add_sorted(collection, [documents[i] for i in indices], [metadatas[i] for i in indices],
+                             [ids[i] for i in indices], batch_size)
+            if label:
+                self.query_per_label = True
+
+    def _add_sorted(self, collection, documents, metadatas, ids, batch_size):
+        # 按长度排序后分块，同一块内文本长度接近，减少编码时的padding
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i]))
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            begin = time.perf_counter()
+            texts = [documents[i] for i in chunk]
+            collection.upsert(
+                documents=texts,
+                embeddings=self.embed(texts, bulk=True),
+                metadatas=[metadatas[i] for i in chunk],
+                ids=[ids[i] for i in chunk]
+            )
+            elapsed = time.perf_counter() - begin
+            info(f"向chroma批量插入: 第 {start // batch_size + 1} 批 {len(chunk)} 条, "
+                 f"耗时 {elapsed:.3f}s, {len(chunk) / elapsed:.0f} 条/秒, "
+                 f"向量缓存命中率 {self.embedding_cache.hit_rate():.1%}")
+
+    def delete_documents(self, ids):
+        if ids:
+            for collection in list(self.collections.values()) or [self.collection]:
+                collection.delete(ids=ids)
+
+    def clear_documents(self):
+        """删除并重建写入目标collection，全量构建前清掉上次构建留下的向量"""
+        if self.per_label:
+            for label, collection in self.collections.items():
+                self.client.delete_collection(collection.name)
+                self.collections[label] = self._label_collection(label)
+        else:
+            self.client.delete_collection(self.collection.name)
+            self.collection = self.client.get_or_create_collection(
+                name="example",
+                embedding_function=self.emb_fn
+            )
+        info("已清空chroma中上次构建的向量")
+
+    def migrate_to_label_collections(self, batch_size=None):
+        """
+        把旧collection中的向量按 label 复制到各标签的collection，直接复用已有向量，不重新编码
+
+        Returns:
+            dict: 标签 -> 迁移条数
+        """
+        batch_size = batch_size or min(int(os.getenv("CHROMA_BATCH_SIZE", 512)), self.client.get_max_batch_size())
+        migrated = {label: 0 for label in self.collections}
+        total = self.collection.count()
+        for offset in range(0, total, batch_size):
+            batch = self.collection.get(limit=batch_size, offset=offset,
+                                        include=["documents", "metadatas", "embeddings"])
+            groups = {}
+            for i, metadata in enumerate(batch['metadatas']):
+                if metadata and metadata.get("label") in self.collections:
+                    groups.setdefault(metadata["label"], []).append(i)
+            for label, indices in groups.items():
+                self.collections[label].upsert(
+                    ids=[batch['ids'][i] for i in indices],
+                    documents=[batch['documents'][i] for i in indices],
+                    metadatas=[batch['metadatas'][i] for i in indices],
+                    embeddings=[batch['embeddings'][i] for i in indices]
+                )
+                migrated[label] += len(indices)
+            info(f"迁移向量: {min(offset + batch_size, total)}/{total}")
+        self.query_per_label = True
+        info(f"迁移到按标签的collection完成: {migrated}")
+        return migrated
 
     def query_document(self, query,label, n_results=1):
-        return self.collection.query(query_texts=[query], n_results=n_results,where={"label": label})
+        collection, where = self.collection_for(label)
+        return collection.query(query_embeddings=self.embed_queries([query]), n_results=n_results,where=where)
+
+    def query_documents(self, entities_by_label, n_results=1):
+        """
+        批量向量检索：所有标签的实体文本一次编码，每个标签一次查询
+
+        Args:
+            entities_by_label (dict): 标签 -> 实体文本列表
+            n_results (int): 每个实体返回的文档数
+
+        Returns:
+            dict: 标签 -> {实体文本: 文档列表}
+        """
+        queries = {label: list(dict.fromkeys(entity for entity in entities if entity))
+                   for label, entities in entities_by_label.items()}
+        texts = [entity for entities in queries.values() for entity in entities]
+        if not texts:
+            return {label: {} for label in queries}
+        begin = time.perf_counter()
+        vectors = self.embed_queries(texts)
+        encoded = time.perf_counter()
+        results = {}
+        offset = 0
+        for label, entities in queries.items():
+            embeddings = vectors[offset:offset + len(entities)]
+            offset += len(entities)
+            if not entities:
+                results[label] = {}
+                continue
+            collection, where = self.collection_for(label)
+            result = collection.query(query_embeddings=embeddings, n_results=n_results, where=where)
+            results[label] = dict(zip(entities, result['documents']))
+        info(f"批量向量检索 {len(texts)} 个实体: 编码 {(encoded - begin) * 1000:.1f}ms, "
+             f"检索 {(time.perf_counter() - encoded) * 1000:.1f}ms, 查询向量缓存 {self.query_cache_stats()}")
+        return results
+
+
+# 基准查询模板，与实体名称组合成不同于库中文档的查询文本
+BENCHMARK_TEMPLATES = ['我有点{}', '{}怎么办', '得了{}吃什么药', '{}是什么']
+
+
+def perturb_query(name, rng):
+    """把实体名称改写成问句片段，较长的名称再随机删掉一个字，避免查询与库中文档完全相同"""
+    if len(name) > 2 and rng.random() < 0.5:
+        i = rng.randrange(len(name))
+        name = name[:i] + name[i + 1:]
+    return rng.choice(BENCHMARK_TEMPLATES).format(name)
+
+
+def benchmark_collections(chroma_utils, samples=200, n_results=1):
+    """
+    对比 单collection按label过滤 与 按标签分collection 的查询延迟和召回率
+
+    每个标签抽取实体名称并改写为问句片段作为查询（见 perturb_query），在该标签内查询；
+    单collection基线由同一批向量临时写入一个带 label 元数据的collection，用完即删除。
+    召回率以该标签全部向量的精确最近邻（暴力计算L2距离）为准。
+    """
+    if not chroma_utils.collections:
+        info("未启用按标签的collection（CHROMA_COLLECTION_MODE=single），无法对比")
+        return
+    documents = {label: chroma_utils.collections[label].get(include=["documents", "embeddings"])
+                 for label in LABELS}
+    batch_size = chroma_utils.client.get_max_batch_size()
+    single_name = f"benchmark_single_{os.getpid()}"
+    single = chroma_utils.client.get_or_create_collection(
+        name=single_name, embedding_function=chroma_utils.emb_fn, configuration={"hnsw": hnsw_configuration()})
+    rng = random.Random(0)
+    try:
+        for label in LABELS:
+            ids = documents[label]['ids']
+            for start in range(0, len(ids), batch_size):
+                single.add(ids=ids[start:start + batch_size],
+                           documents=documents[label]['documents'][start:start + batch_size],
+                           metadatas=[{"label": label}] * len(ids[start:start + batch_size]),
+                           embeddings=documents[label]['embeddings'][start:start + batch_size])
+
+        for label in LABELS:
+            embeddings = np.asarray(documents[label]['embeddings'], dtype=np.float32)
+            if not len(embeddings):
+                continue
+            names = documents[label]['documents']
+            queries = [perturb_query(name, rng) for name in rng.sample(names, min(samples, len(names)))]
+            vectors = np.asarray(chroma_utils.embed_queries(queries), dtype=np.float32)
+            ids = np.array(documents[label]['ids'])
+            # |q - e|^2 = |q|^2 - 2q·e + |e|^2，|q|^2 对排序无影响
+            distances = (embeddings ** 2).sum(axis=1)[None, :] - 2 * vectors @ embeddings.T
+            exact = ids[np.argsort(distances, axis=1)[:, :n_results]]
+            for mode, collection, where in (("单collection过滤", single, {"label": label}),
+                                            ("按标签collection", chroma_utils.collections[label], None)):
+                begin = time.perf_counter()
+                result = collection.query(query_embeddings=vectors.tolist(), n_results=n_results, where=where)
+                elapsed = (time.perf_counter() - begin) / len(queries) * 1000
+                recall = np.mean([len(set(found) & set(expected)) / n_results
+                                  for found, expected in zip(result['ids'], exact)])
+                info(f"{label} {mode}: 平均 {elapsed:.2f}ms/次, recall@{n_results} {recall:.3f}")
+    finally:
+        chroma_utils.client.delete_collection(single_name)
 
 
 # # 添加中文文档
@@ -46,3 +358,14 @@ class ChromeUtils:
 # # 查询
 # results = collection.query(query_texts=["阿里巴巴在哪个城市？"], n_results=1)
 # print("最相关文档:", results['documents'][0])
+
+
+if __name__ == "__main__":
+    # 迁移: python -m utils.chroma_utils migrate
+    # 基准: python -m utils.chroma_utils benchmark [查询数]
+    chroma_utils = ChromeUtils()
+    command = sys.argv[1] if len(sys.argv) > 1 else "benchmark"
+    if command == "migrate":
+        chroma_utils.migrate_to_label_collections()
+    else:
+        benchmark_collections(chroma_utils, int(sys.argv[2]) if len(sys.argv) > 2 else 200)
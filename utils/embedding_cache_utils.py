@@ -0,0 +1,130 @@
+import fcntl
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from utils.logger_utils import info
+
+KEY_SIZE = 20  # sha1 摘要字节数
+
+
+class EmbeddingCache:
+    """
+    持久化的内容寻址向量缓存
+
+    以 (模型id, 文本sha1) 为键，每个模型一个目录：
+        keys.bin     追加写入的 sha1 摘要，第 i 个摘要对应第 i 行向量
+        vectors.f32  追加写入的 float32 向量，通过 np.memmap 只读映射
+        meta.json    模型id 和向量维度
+    多进程追加时通过 flock 串行化。
+    """
+
+    def __init__(self, cache_path, model_id):
+        self.model_id = model_id or ''
+        model_key = hashlib.sha1(self.model_id.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(cache_path, model_key)
+        os.makedirs(self.path, exist_ok=True)
+        self.keys_path = os.path.join(self.path, 'keys.bin')
+        self.vectors_path = os.path.join(self.path, 'vectors.f32')
+        self.meta_path = os.path.join(self.path, 'meta.json')
+        self.lock_path = os.path.join(self.path, '.lock')
+        self.hits = 0
+        self.misses = 0
+        self.dim = None
+        self.index = {}
+        self.vectors = None
+        self._load()
+
+    def _load(self):
+        """读取磁盘上新追加的记录并重新映射向量文件"""
+        if not os.path.exists(self.meta_path):
+            return
+        if self.dim is None:
+            with open(self.meta_path, encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+        loaded = len(self.index)
+        with open(self.keys_path, 'rb') as f:
+            f.seek(loaded * KEY_SIZE)
+            keys = f.read()
+        # 以较短的文件为准，丢弃中途崩溃留下的半条记录
+        rows = min(loaded + len(keys) // KEY_SIZE, os.path.getsize(self.vectors_path) // (4 * self.dim))
+        for row in range(loaded, rows):
+            offset = (row - loaded) * KEY_SIZE
+            self.index[keys[offset:offset + KEY_SIZE]] = row
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                 shape=(rows, self.dim)) if rows else None
+
+    @staticmethod
+    def _key(text):
+        return hashlib.sha1(text.encode('utf-8')).digest()
+
+    def get_many(self, texts):
+        """返回与 texts 对齐的向量列表，未命中的位置为 None"""
+        result = []
+        for text in texts:
+            row = self.index.get(self._key(text))
+            result.append(None if row is None else np.array(self.vectors[row]))
+        return result
+
+    def put_many(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with open(self.lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model_id': self.model_id, 'dim': self.dim}, f)
+                open(self.keys_path, 'ab').close()
+                open(self.vectors_path, 'ab').close()
+            # 其他进程可能已追加过，先按磁盘上的最新内容对齐
+            self._load()
+            rows = len(self.index)
+            os.truncate(self.keys_path, rows * KEY_SIZE)
+            os.truncate(self.vectors_path, rows * 4 * self.dim)
+            new_keys = {}
+            for text, vector in zip(texts, vectors):
+                key = self._key(text)
+                if key not in self.index:
+                    new_keys.setdefault(key, vector)
+            if new_keys:
+                new_vectors = list(new_keys.values())
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(np.stack(new_vectors).tobytes())
+                with open(self.keys_path, 'ab') as f:
+                    f.write(b''.join(new_keys))
+                self._load()
+
+    def encode(self, texts, encode_fn, persist=True):
+        """
+        命中缓存的文本直接返回缓存向量，只把未命中的文本交给 encode_fn 编码
+
+        Args:
+            persist (bool): 是否把新编码的向量写入缓存；只有构建时的节点名称写入，
+                查询时的任意文本只读缓存，避免缓存无限增长和多进程争用文件锁
+        """
+        texts = list(texts)
+        vectors = self.get_many(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = np.asarray(encode_fn(unique), dtype=np.float32)
+            if persist:
+                self.put_many(unique, encoded)
+            encoded = dict(zip(unique, encoded))
+            for i in missing:
+                vectors[i] = encoded[texts[i]]
+        return vectors
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def report(self):
+        info(f"向量缓存: 命中 {self.hits}, 未命中 {self.misses}, 命中率 {self.hit_rate():.1%}, "
+             f"已缓存 {len(self.index)} 条")
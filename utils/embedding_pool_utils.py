@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+from utils.logger_utils import info
+
+load_dotenv()
+
+_worker_emb_fn = None
+
+
+def _init_worker(model_path, threads):
+    """每个工作进程只加载一次模型，并限制torch线程数避免多进程间争抢CPU"""
+    global _worker_emb_fn
+    import torch
+    from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+    torch.set_num_threads(threads)
+    _worker_emb_fn = SentenceTransformerEmbeddingFunction(model_path)
+
+
+def _encode_shard(texts):
+    return [vector.tolist() for vector in _worker_emb_fn(texts)]
+
+
+class EmbeddingPool:
+    """
+    多进程向量编码
+
+    文本按进程数切分为若干分片并发编码，结果按输入顺序合并返回，
+    可直接作为 EmbeddingCache.encode 的 encode_fn 使用。
+    """
+
+    def __init__(self, model_path, workers, shard_size=64):
+        self.workers = workers
+        self.shard_size = shard_size
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_path, threads))
+        info(f"向量编码进程池已启动: {workers} 个进程, 每进程 {threads} 个线程")
+
+    def __call__(self, texts):
+        texts = list(texts)
+        shard_size = min(self.shard_size, max(1, -(-len(texts) // self.workers)))
+        shards = [texts[start:start + shard_size] for start in range(0, len(texts), shard_size)]
+        vectors = []
+        for shard_vectors in self.executor.map(_encode_shard, shards):
+            vectors.extend(shard_vectors)
+        return vectors
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def benchmark(texts, worker_counts):
+    """按不同进程数编码同一批文本，报告吞吐量和相对单进程的加速比"""
+    model_path = os.getenv("LOCAL_MODEL_PATH", None)
+    baseline = None
+    for workers in worker_counts:
+        pool = EmbeddingPool(model_path, workers)
+        pool(texts[:workers])  # 预热，等待所有进程加载完模型
+        begin = time.perf_counter()
+        pool(texts)
+        elapsed = time.perf_counter() - begin
+        pool.close()
+        baseline = baseline or elapsed
+        info(f"{workers} 个进程: 编码 {len(texts)} 条, 耗时 {elapsed:.2f}s, "
+             f"{len(texts) / elapsed:.0f} 条/秒, 加速比 {baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    from utils.medical_utils import EntityRecord, iter_medical_records
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else os.getcwd() + '/data/medical.json'
+    texts = [record.name for record in iter_medical_records(data_path) if isinstance(record, EntityRecord)]
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    benchmark(texts, worker_counts)
@@ -0,0 +1,165 @@
+import os
+import pickle
+import time
+import unicodedata
+
+import ahocorasick
+
+from utils.logger_utils import info, error
+from utils.medical_utils import DiseaseRecord, EntityRecord, iter_medical_records
+
+# 参与精确匹配的实体标签
+MATCHED_LABELS = ['Disease', 'Symptom', 'Drug']
+# 同一名称属于多个标签时（如“腹泻”既是疾病也是症状），整段抽取只归入优先级最高的标签
+LABEL_PRIORITY = ['Symptom', 'Disease', 'Drug']
+
+
+def normalize_name(text):
+    """全角转半角、去掉首尾空白并转小写，用于精确匹配"""
+    return unicodedata.normalize('NFKC', text).strip().lower()
+
+
+def strip_punctuation(text):
+    """去掉标点和空白，计算覆盖率时只看实际内容"""
+    return ''.join(char for char in text if not char.isspace() and not unicodedata.category(char).startswith('P'))
+
+
+class EntityMatcher:
+    """
+    基于 Aho-Corasick 自动机的实体名称精确匹配
+
+    自动机在构建图谱时由全部疾病、症状、药品名称生成并保存到本地，查询进程启动时加载。
+    文本规范化后（或去掉标点、空白后）与某个名称完全相同即命中；否则取文本中最长的名称，
+    若覆盖了去掉标点、空白后文本的 min_coverage 以上也视为命中（如名称后多了语气词）。
+    未命中的文本再交给向量检索。
+    """
+
+    def __init__(self, automaton, min_coverage=0.8, label_priority=None):
+        self.automaton = automaton
+        self.min_coverage = min_coverage
+        self.label_priority = label_priority or LABEL_PRIORITY
+        self.lookups = 0
+        self.hits = 0
+        self.match_seconds = 0.0
+        self.fallback_lookups = 0
+        self.fallback_seconds = 0.0
+
+    @classmethod
+    def from_names(cls, names_by_label, min_coverage=0.8):
+        """
+        Args:
+            names_by_label (dict): 标签 -> 名称集合
+        """
+        labels_by_key = {}
+        for label, names in names_by_label.items():
+            for name in names:
+                key = normalize_name(name)
+                if key:
+                    entry = labels_by_key.setdefault(key, {})
+                    entry.setdefault(label, name)
+        automaton = ahocorasick.Automaton()
+        for key, names in labels_by_key.items():
+            automaton.add_word(key, (len(key), names))
+        automaton.make_automaton()
+        return cls(automaton, min_coverage)
+
+    @classmethod
+    def from_data(cls, data_path, min_coverage=0.8):
+        """从 medical.json 收集疾病、症状、药品名称生成自动机"""
+        names_by_label = {label: set() for label in MATCHED_LABELS}
+        for record in iter_medical_records(data_path):
+            if isinstance(record, DiseaseRecord):
+                names_by_label['Disease'].add(record.properties['name'])
+            elif isinstance(record, EntityRecord) and record.label in names_by_label:
+                names_by_label[record.label].add(record.name)
+        return cls.from_names(names_by_label, min_coverage)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self.automaton, f)
+        info(f"实体自动机已保存: {path}, 共 {len(self.automaton)} 个名称")
+
+    @classmethod
+    def load(cls, path, min_coverage=0.8, label_priority=None):
+        """加载构建时保存的自动机，文件不存在或损坏时返回 None"""
+        if not os.path.exists(path):
+            info(f"未找到实体自动机 {path}，全部实体走向量检索")
+            return None
+        try:
+            with open(path, 'rb') as f:
+                automaton = pickle.load(f)
+        except Exception as e:
+            error(f"加载实体自动机失败: {str(e)}")
+            return None
+        info(f"实体自动机已加载: {path}, 共 {len(automaton)} 个名称")
+        return cls(automaton, min_coverage, label_priority)
+
+    def _match(self, text, label):
+        key = normalize_name(text)
+        if not key:
+            return None
+        content = strip_punctuation(key)
+        for candidate in (key, content):
+            value = self.automaton.get(candidate, None)
+            if value and label in value[1]:
+                return value[1][label]
+        # 文本中最长的同标签名称，覆盖率足够时视为命中；标点和空白不计入文本长度
+        best = None
+        for _, (length, names) in self.automaton.iter(key):
+            if label in names and (best is None or length > best[0]):
+                best = (length, names[label])
+        if best and best[0] >= self.min_coverage * len(content):
+            return best[1]
+        return None
+
+    def lookup(self, text, label):
+        """
+        Returns:
+            str: 命中的图谱实体名称，未命中为 None
+        """
+        begin = time.perf_counter()
+        name = self._match(text, label)
+        self.match_seconds += time.perf_counter() - begin
+        self.lookups += 1
+        if name is not None:
+            self.hits += 1
+        return name
+
+    def extract(self, text, min_length=2):
+        """
+        扫描整段文本，按最左最长、互不重叠的原则提取出现的实体名称，
+        每个名称只归入一个标签（按 label_priority）
+
+        Args:
+            text (str): 问句
+            min_length (int): 名称最短长度，过短的名称容易误匹配
+
+        Returns:
+            dict: 标签 -> 按出现顺序去重的图谱实体名称列表
+        """
+        key = normalize_name(text)
+        matches = sorted(((end - length + 1, length, names) for end, (length, names) in self.automaton.iter(key)
+                          if length >= min_length), key=lambda match: (match[0], -match[1]))
+        entities = {label: [] for label in MATCHED_LABELS}
+        covered = 0
+        for start, length, names in matches:
+            if start < covered:
+                continue
+            covered = start + length
+            label = next((label for label in self.label_priority if label in names and label in entities), None)
+            if label and names[label] not in entities[label]:
+                entities[label].append(names[label])
+        return entities
+
+    def record_fallback(self, count, seconds):
+        """记录走向量检索的实体数和耗时，用于估算节省的延迟"""
+        self.fallback_lookups += count
+        self.fallback_seconds += seconds
+
+    def report(self):
+        skip_rate = self.hits / self.lookups if self.lookups else 0.0
+        per_fallback = self.fallback_seconds / self.fallback_lookups if self.fallback_lookups else 0.0
+        saved = self.hits * per_fallback - self.match_seconds
+        info(f"实体精确匹配: 查询 {self.lookups} 个, 命中 {self.hits} 个, 跳过向量模型比例 {skip_rate:.1%}, "
+             f"匹配耗时 {self.match_seconds * 1000:.1f}ms, 估计节省 {saved * 1000:.1f}ms")
+        return {'lookups': self.lookups, 'hits': self.hits, 'skip_rate': skip_rate, 'saved_seconds': saved}
@@ -0,0 +1,219 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from utils.logger_utils import info, error
+from utils.medical_utils import DISEASE_DEGREE_PROPERTY, SYMPTOM_WEIGHT_PROPERTY
+
+
+class CsrRelation:
+    """
+    单一关系类型的压缩稀疏行(CSR)邻接表
+
+    起始节点、目标节点各自映射为整数id，目标节点按名称排序编号，
+    所以同分时 id 越小名称越靠前，与 Cypher 中 ORDER BY ... d.name 一致。
+    可选的起始节点权重、目标节点度数与 build_rank_query 的加权排序对应。
+    """
+
+    def __init__(self, sources, targets, indptr, indices, source_weights=None, target_degrees=None):
+        self.sources = sources
+        self.targets = targets
+        self.source_ids = {name: i for i, name in enumerate(sources)}
+        self.indptr = indptr
+        self.indices = indices
+        self.source_weights = source_weights
+        self.target_degrees = target_degrees
+
+    @classmethod
+    def from_edges(cls, edges):
+        sources = sorted({source for source, _ in edges})
+        targets = sorted({target for _, target in edges})
+        source_ids = {name: i for i, name in enumerate(sources)}
+        target_ids = {name: i for i, name in enumerate(targets)}
+        pairs = np.array(sorted({(source_ids[s], target_ids[t]) for s, t in edges}),
+                         dtype=np.int32).reshape(-1, 2)
+        indptr = np.zeros(len(sources) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=len(sources)), out=indptr[1:])
+        return cls(sources, targets, indptr, pairs[:, 1].copy())
+
+    def set_stats(self, weights, degrees):
+        """按名称设置起始节点权重（缺省为1）和目标节点度数（缺省为0）"""
+        self.source_weights = np.array([weights.get(name) or 1.0 for name in self.sources], dtype=np.float64)
+        self.target_degrees = np.array([degrees.get(name) or 0 for name in self.targets], dtype=np.int64)
+
+    def top_k(self, names, k):
+        """
+        返回 [(目标节点名称, 命中次数, 得分)]，按得分降序、命中次数降序、度数升序、名称升序取前k个
+
+        未设置权重时得分即命中次数
+        """
+        ids = np.array([self.source_ids[name] for name in names if name in self.source_ids], dtype=np.int64)
+        if not len(ids):
+            return []
+        lengths = self.indptr[ids + 1] - self.indptr[ids]
+        hits = np.concatenate([self.indices[self.indptr[i]:self.indptr[i + 1]] for i in ids])
+        n = len(self.targets)
+        counts = np.bincount(hits, minlength=n)
+        if self.source_weights is None:
+            scores = counts.astype(np.float64)
+        else:
+            scores = np.bincount(hits, weights=np.repeat(self.source_weights[ids], lengths), minlength=n)
+        degrees = self.target_degrees if self.target_degrees is not None else np.zeros(n, dtype=np.int64)
+        max_degree = int(degrees.max()) if n else 0
+
+        def tie_keys(candidates):
+            # 命中次数、度数、名称顺序合成唯一的整数键，越大越靠前
+            return (counts[candidates].astype(np.int64) * (max_degree + 1) + (max_degree - degrees[candidates])) \
+                * n + (n - 1 - candidates)
+
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > k:
+            # 先按得分取前k，只在恰好处于第k名得分的并列组内按次级键选取
+            candidate_scores = scores[candidates]
+            cutoff = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+            above = candidates[candidate_scores > cutoff]
+            tied = candidates[candidate_scores == cutoff]
+            need = k - len(above)
+            if len(tied) > need:
+                tied = tied[np.argpartition(-tie_keys(tied), need - 1)[:need]] if need else tied[:0]
+            candidates = np.concatenate([above, tied])
+        order = np.lexsort((-tie_keys(candidates), -scores[candidates]))
+        return [(self.targets[i], int(counts[i]), float(scores[i])) for i in candidates[order]]
+
+    def nbytes(self):
+        stats = sum(array.nbytes for array in (self.source_weights, self.target_degrees) if array is not None)
+        return self.indptr.nbytes + self.indices.nbytes + stats + sum(
+            sys.getsizeof(name) for name in self.sources + self.targets)
+
+
+class GraphIndex:
+    """
+    诊断热路径的进程内索引
+
+    只加载 symptom_disease、recommand_drug 两类关系和疾病摘要字段，
+    优先读取与当前构建版本一致的本地产物，否则从 Neo4j 加载一次并写出产物；
+    构建清单的版本变化后自动重新加载。
+    """
+
+    relations = {
+        'symptom_disease': ('Symptom', 'Disease'),
+        'recommand_drug': ('Disease', 'Drug'),
+    }
+    # 参与加权排序的关系 -> (起始节点权重属性, 目标节点度数属性)
+    stats = {
+        'symptom_disease': (SYMPTOM_WEIGHT_PROPERTY, DISEASE_DEGREE_PROPERTY),
+    }
+
+    def __init__(self, graph_db_utils, manifest_path, artifact_path, summary_fields):
+        self.graph_db_utils = graph_db_utils
+        self.manifest_path = manifest_path
+        self.artifact_path = artifact_path
+        self.summary_fields = summary_fields
+        self.version = None
+        self.manifest_mtime = None
+        self.csr = {}
+        self.properties = {}
+
+    def _manifest_version(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, encoding='utf-8') as f:
+            return json.load(f)['version']
+
+    def refresh_if_stale(self):
+        mtime = os.path.getmtime(self.manifest_path) if os.path.exists(self.manifest_path) else None
+        if self.csr and mtime == self.manifest_mtime:
+            return
+        self.manifest_mtime = mtime
+        version = self._manifest_version()
+        if self.csr and version == self.version:
+            return
+        begin = time.perf_counter()
+        if not self._load_artifact(version):
+            self._load_from_graph()
+            self._save_artifact(version)
+        self.version = version
+        info(f"图索引已加载: 版本 {version}, 内存约 {self.nbytes() / 1024 / 1024:.1f}MB, "
+             f"耗时 {time.perf_counter() - begin:.2f}s")
+
+    def _load_from_graph(self):
+        # 三次查询共用一个会话
+        with self.graph_db_utils.unit_of_work():
+            for rel_type, (from_label, to_label) in self.relations.items():
+                result = self.graph_db_utils.run_cypher(
+                    f"MATCH (s:{from_label})-[:{rel_type}]->(d:{to_label}) RETURN s.name AS source, d.name AS target",
+                    write=False)
+                if not result['success']:
+                    raise RuntimeError(result['error'])
+                self.csr[rel_type] = CsrRelation.from_edges(
+                    [(record['source'], record['target']) for record in result['records']])
+                if rel_type in self.stats:
+                    weight_property, degree_property = self.stats[rel_type]
+                    weights = self.graph_db_utils.run_cypher(
+                        f"MATCH (s:{from_label}) RETURN s.name AS name, s.{weight_property} AS value", write=False)
+                    degrees = self.graph_db_utils.run_cypher(
+                        f"MATCH (d:{to_label}) RETURN d.name AS name, d.{degree_property} AS value", write=False)
+                    if not weights['success'] or not degrees['success']:
+                        raise RuntimeError(weights.get('error') or degrees.get('error'))
+                    self.csr[rel_type].set_stats(
+                        {record['name']: record['value'] for record in weights['records']},
+                        {record['name']: record['value'] for record in degrees['records']})
+            projection = ', '.join('.' + field for field in ['name'] + self.summary_fields)
+            result = self.graph_db_utils.run_cypher(
+                f"MATCH (d:Disease) RETURN d {{{projection}}} AS properties", write=False)
+            if not result['success']:
+                raise RuntimeError(result['error'])
+        self.properties = {record['properties']['name']: record['properties'] for record in result['records']}
+
+    def _save_artifact(self, version):
+        if version is None:
+            return
+        arrays = {}
+        for rel_type, csr in self.csr.items():
+            arrays[f"{rel_type}.indptr"] = csr.indptr
+            arrays[f"{rel_type}.indices"] = csr.indices
+            if csr.source_weights is not None:
+                arrays[f"{rel_type}.weights"] = csr.source_weights
+                arrays[f"{rel_type}.degrees"] = csr.target_degrees
+        meta = {
+            'version': version,
+            'names': {rel_type: [csr.sources, csr.targets] for rel_type, csr in self.csr.items()},
+            'properties': self.properties,
+        }
+        try:
+            with open(self.artifact_path, 'wb') as f:
+                np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+        except Exception as e:
+            error(f"写入图索引产物失败: {str(e)}")
+
+    def _load_artifact(self, version):
+        if version is None or not os.path.exists(self.artifact_path):
+            return False
+        with np.load(self.artifact_path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['version'] != version:
+                return False
+            self.csr = {
+                rel_type: CsrRelation(
+                    sources, targets, data[f"{rel_type}.indptr"], data[f"{rel_type}.indices"],
+                    data[f"{rel_type}.weights"] if f"{rel_type}.weights" in data.files else None,
+                    data[f"{rel_type}.degrees"] if f"{rel_type}.degrees" in data.files else None)
+                for rel_type, (sources, targets) in meta['names'].items()
+            }
+        self.properties = meta['properties']
+        return True
+
+    def top_k(self, rel_type, names, k):
+        self.refresh_if_stale()
+        begin = time.perf_counter()
+        result = self.csr[rel_type].top_k(names, k)
+        info(f"图索引查询 {rel_type}: {len(names)} 个起点, 耗时 {(time.perf_counter() - begin) * 1000:.2f}ms")
+        return result
+
+    def nbytes(self):
+        return sum(csr.nbytes() for csr in self.csr.values()) + sum(
+            sys.getsizeof(value) for properties in self.properties.values() for value in properties.values()
+            if isinstance(value, str))
@@ -0,0 +1,50 @@
+import os
+
+from utils.medical_utils import DISEASE_DEGREE_PROPERTY, SYMPTOM_WEIGHT_PROPERTY
+from utils.neo4j_utils import TraversalHop
+from utils.result_cache_utils import ResultCache
+
+# graph_manager 与 async_graph_manager 共用的查询定义和结果缓存，导入时不创建数据库连接
+
+# llm_summary 生成诊断时用到的疾病字段
+summary_fields = ['desc', 'cause', 'prevent', 'cure_way', 'cure_department', 'cure_lasttime', 'cured_prob']
+
+# 查询结果缓存，以规范化后的实体集合为键，图谱重新构建后自动失效；
+# 设置 RESULT_CACHE_SHARED_PATH 后多个工作进程共享同一个 sqlite 缓存文件
+result_cache = ResultCache(
+    os.getenv('GRAPH_MANIFEST_PATH', os.getcwd() + '/.graph_manifest.json'),
+    max_size=int(os.getenv('RESULT_CACHE_SIZE', 1024)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 300)),
+    shared_path=os.getenv('RESULT_CACHE_SHARED_PATH'))
+
+# 症状 -> 疾病 -> 药品 一次查询：先按症状特异性权重之和排序出前 $top_k 个疾病，
+# 再在子查询中对这些疾病的推荐药品聚合排序取前 $drug_k 个
+diagnosis_query = f"""
+UNWIND $symptoms AS symptom
+MATCH (s:Symptom {{name: symptom}})-[:symptom_disease]->(d:Disease)
+WITH d, count(*) AS count, sum(coalesce(s.{SYMPTOM_WEIGHT_PROPERTY}, 1.0)) AS score
+ORDER BY score DESC, count DESC, coalesce(d.{DISEASE_DEGREE_PROPERTY}, 0), d.name
+LIMIT $top_k
+WITH collect({{name: d.name, count: count, score: score,
+               properties: d {{.name, {', '.join('.' + field for field in summary_fields)}}}}}) AS diseases,
+     collect(d) AS nodes
+CALL {{
+    WITH nodes
+    UNWIND nodes AS d
+    MATCH (d)-[:recommand_drug]->(drug:Drug)
+    WITH drug, count(*) AS count
+    ORDER BY count DESC, drug.name
+    LIMIT $drug_k
+    RETURN collect(drug.name) AS drugs
+}}
+RETURN diseases, drugs
+"""
+
+
+def complication_hops(disease_k=3, complication_k=5, drug_k=5):
+    """症状 -> 疾病 -> 并发症 -> 药品 的遍历路径"""
+    return [
+        TraversalHop(['symptom_disease'], 'outgoing', 'Disease', disease_k),
+        TraversalHop(['acompany_with'], 'both', 'Disease', complication_k),
+        TraversalHop(['recommand_drug', 'common_drug'], 'outgoing', 'Drug', drug_k),
+    ]
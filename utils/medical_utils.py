@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import resource
+import sys
+import time
+from collections import Counter, namedtuple
+
+from utils.logger_utils import info
+
+# 流式解析产出的三类记录
+DiseaseRecord = namedtuple('DiseaseRecord', ['properties'])
+EntityRecord = namedtuple('EntityRecord', ['label', 'name'])
+EdgeRecord = namedtuple('EdgeRecord', ['kind', 'start', 'end'])
+
+# 疾病节点保留的属性及默认值
+DISEASE_FIELDS = ['desc', 'prevent', 'cause', 'easy_get', 'cure_department',
+                  'cure_way', 'cure_lasttime', 'symptom', 'cured_prob']
+
+# 边的种类 -> (起始节点标签, 关系类型, 目标节点标签, 关系名称)
+EDGE_KINDS = {
+    'check': ('Disease', 'need_check', 'Check', '诊断检查'),
+    'recommandeat': ('Disease', 'recommand_eat', 'Food', '推荐食谱'),
+    'noteat': ('Disease', 'no_eat', 'Food', '忌吃'),
+    'doeat': ('Disease', 'do_eat', 'Food', '宜吃'),
+    'department': ('Department', 'belongs_to', 'Department', '属于'),
+    'commonddrug': ('Disease', 'common_drug', 'Drug', '常用药品'),
+    'drug_producer': ('Producer', 'drugs_of', 'Drug', '生产药品'),
+    'recommanddrug': ('Disease', 'recommand_drug', 'Drug', '好评药品'),
+    'symptom': ('Symptom', 'symptom_disease', 'Disease', '症状'),
+    'acompany': ('Disease', 'acompany_with', 'Disease', '并发症'),
+    'category': ('Disease', 'belongs_to', 'Department', '所属科室'),
+}
+
+# 构建时预计算的排序统计：症状的特异性权重（类IDF）、疾病关联的症状数
+SYMPTOM_WEIGHT_PROPERTY = 'weight'
+DISEASE_DEGREE_PROPERTY = 'symptom_count'
+
+
+def iter_medical_records(data_path):
+    """
+    流式解析 medical.json，逐行产出 DiseaseRecord / EntityRecord / EdgeRecord
+
+    实体名称经 sys.intern 驻留并在线去重，每个实体只产出一次；
+    除去重集合外内存占用与文件大小无关。
+    """
+    seen = {}
+
+    def entity(label, name):
+        name = sys.intern(name)
+        names = seen.setdefault(label, set())
+        if name in names:
+            return name, None
+        names.add(name)
+        return name, EntityRecord(label, name)
+
+    def entities(label, names):
+        for name in names:
+            name, record = entity(label, name)
+            if record:
+                yield record
+
+    with open(data_path, encoding='utf-8') as f:
+        for data in f:
+            data_json = json.loads(data)
+            disease, _ = entity('Disease', data_json['name'])
+            disease_dict = {'name': disease}
+            for field in DISEASE_FIELDS:
+                disease_dict[field] = ''
+
+            if 'symptom' in data_json:
+                yield from entities('Symptom', data_json['symptom'])
+                for symptom in data_json['symptom']:
+                    yield EdgeRecord('symptom', sys.intern(symptom), disease)
+
+            if 'acompany' in data_json:
+                for acompany in data_json['acompany']:
+                    yield EdgeRecord('acompany', disease, sys.intern(acompany))
+
+            for field in ['desc', 'prevent', 'cause', 'get_prob', 'easy_get',
+                          'cure_way', 'cure_lasttime', 'cured_prob']:
+                if field in data_json:
+                    disease_dict[field] = data_json[field]
+
+            if 'cure_department' in data_json:
+                cure_department = [sys.intern(i) for i in data_json['cure_department']]
+                if len(cure_department) == 1:
+                    yield EdgeRecord('category', disease, cure_department[0])
+                if len(cure_department) == 2:
+                    big = cure_department[0]
+                    small = cure_department[1]
+                    yield EdgeRecord('department', small, big)
+                    yield EdgeRecord('category', disease, small)
+
+                disease_dict['cure_department'] = cure_department
+                yield from entities('Department', cure_department)
+
+            if 'common_drug' in data_json:
+                common_drug = data_json['common_drug']
+                yield from entities('Drug', common_drug)
+                for drug in common_drug:
+                    yield EdgeRecord('commonddrug', disease, sys.intern(drug))
+
+            if 'recommand_drug' in data_json:
+                recommand_drug = data_json['recommand_drug']
+                yield from entities('Drug', recommand_drug)
+                for drug in recommand_drug:
+                    yield EdgeRecord('recommanddrug', disease, sys.intern(drug))
+
+            if 'not_eat' in data_json:
+                for kind, field in [('noteat', 'not_eat'), ('doeat', 'do_eat'),
+                                    ('recommandeat', 'recommand_eat')]:
+                    foods = data_json[field]
+                    for food in foods:
+                        yield EdgeRecord(kind, disease, sys.intern(food))
+                    yield from entities('Food', foods)
+
+            if 'check' in data_json:
+                check = data_json['check']
+                for _check in check:
+                    yield EdgeRecord('check', disease, sys.intern(_check))
+                yield from entities('Check', check)
+
+            if 'drug_detail' in data_json:
+                for detail in data_json['drug_detail']:
+                    producer = detail.split('(')[0]
+                    producer, record = entity('Producer', producer)
+                    if record:
+                        yield record
+                    yield EdgeRecord('drug_producer', producer,
+                                     sys.intern(detail.split('(')[-1].replace(')', '')))
+
+            yield DiseaseRecord(disease_dict)
+
+
+def disease_digest(data_json):
+    """疾病记录的内容哈希，与字段顺序无关"""
+    content = json.dumps(data_json, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def stable_id(label, name):
+    """由标签和名称得到的稳定节点id，跨构建保持不变"""
+    return f"{label}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:16]}"
+
+
+def iter_disease_digests(data_path):
+    """逐行产出 (疾病名称, 内容哈希)，用于增量构建时比对清单"""
+    with open(data_path, encoding='utf-8') as f:
+        for data in f:
+            data_json = json.loads(data)
+            yield data_json['name'], disease_digest(data_json)
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存(MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 下单位为 KB，macOS 下为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def report_parse_stats(data_path):
+    """
+    完整消费一遍流式解析器，报告解析耗时、峰值内存和各类记录数量
+    """
+    begin = time.perf_counter()
+    counts = Counter()
+    for record in iter_medical_records(data_path):
+        if isinstance(record, EdgeRecord):
+            counts[f"edge:{record.kind}"] += 1
+        elif isinstance(record, EntityRecord):
+            counts[f"entity:{record.label}"] += 1
+        else:
+            counts['disease'] += 1
+    elapsed = time.perf_counter() - begin
+    stats = {'elapsed': elapsed, 'peak_rss_mb': peak_rss_mb(), 'counts': dict(counts)}
+    info(f"解析 {data_path}: 耗时 {elapsed:.2f}s, 峰值内存 {stats['peak_rss_mb']:.1f}MB, "
+         f"疾病 {counts['disease']} 条, 实体 {sum(v for k, v in counts.items() if k.startswith('entity:'))} 个, "
+         f"关系 {sum(v for k, v in counts.items() if k.startswith('edge:'))} 条")
+    return stats
+
+
+if __name__ == "__main__":
+    report_parse_stats(sys.argv[1] if len(sys.argv) > 1 else os.getcwd() + '/data/medical.json')
@@ -1,33 +1,128 @@
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, unit_of_work as managed_transaction
+from neo4j.exceptions import ConnectionAcquisitionTimeoutError
+import copy
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from utils.logger_utils import info, error
+from utils.medical_utils import EDGE_KINDS
 
 load_dotenv()
 
+# 关系类型 -> 构建时写入的 (起点标签, 终点标签) 组合，由 EDGE_KINDS 得出
+SCHEMA_LABEL_PAIRS = {
+    relationship_type: {(start, end) for start, rel, end, _ in EDGE_KINDS.values() if rel == relationship_type}
+    for _, relationship_type, _, _ in EDGE_KINDS.values()
+}
+
 
 class Node:
+    """
+    节点记录
+    
+    使用 __slots__ 减少每个对象的内存；由 from_entity 创建时直接持有驱动返回的节点，
+    labels 和 properties 在首次访问时才复制。
+    """
+    __slots__ = ('id', '_labels', '_properties', '_entity')
+    
     def __init__(self, id, labels, properties):
         self.id = id
-        self.labels = labels
-        self.properties = properties
+        self._labels = labels
+        self._properties = properties
+        self._entity = None
+    
+    @classmethod
+    def from_entity(cls, entity):
+        node = cls.__new__(cls)
+        node.id = entity.id
+        node._labels = None
+        node._properties = None
+        node._entity = entity
+        return node
+    
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = list(self._entity.labels)
+        return self._labels
+    
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = dict(self._entity)
+        return self._properties
+    
+    def get(self, key, default=None):
+        """读取单个属性，不复制整个属性字典"""
+        if self._properties is None:
+            return self._entity.get(key, default)
+        return self._properties.get(key, default)
 
 class Relationship:
+    """
+    关系记录，与 Node 一样使用 __slots__ 并延迟复制属性
+    """
+    __slots__ = ('id', 'type', '_properties', '_entity')
+    
     def __init__(self, id, type, properties):
         self.id = id
         self.type = type
-        self.properties = properties
+        self._properties = properties
+        self._entity = None
+    
+    @classmethod
+    def from_entity(cls, entity):
+        relationship = cls.__new__(cls)
+        relationship.id = entity.id
+        relationship.type = entity.type
+        relationship._properties = None
+        relationship._entity = entity
+        return relationship
+    
+    @property
+    def properties(self):
+        if self._properties is None:
+            self._properties = dict(self._entity)
+        return self._properties
+    
+    def get(self, key, default=None):
+        """读取单个属性，不复制整个属性字典"""
+        if self._properties is None:
+            return self._entity.get(key, default)
+        return self._properties.get(key, default)
 
 class QueryCondition:
     """
     统一的查询条件数据结构
     消除特殊情况，让所有查询都使用相同的接口
     """
-    def __init__(self, label=None, properties=None, relationship_type=None, direction="outgoing"):
+    def __init__(self, label=None, properties=None, relationship_type=None, direction="outgoing",
+                 return_properties=None):
         self.label = label
         self.properties = properties or {}
         self.relationship_type = relationship_type
         self.direction = direction  # "outgoing", "incoming", "both"
+        # 需要返回的属性名列表，None 表示返回完整的节点或关系
+        self.return_properties = return_properties
+
+
+class TraversalHop:
+    """
+    多跳遍历中的一跳
+    
+    relationship_types 为允许的关系类型列表（为空表示任意类型），
+    limit 为这一跳最多保留的节点数，即下一跳的起点数量上限
+    """
+    def __init__(self, relationship_types=None, direction="outgoing", label=None, limit=10,
+                 return_properties=None):
+        self.relationship_types = relationship_types or []
+        self.direction = direction  # "outgoing", "incoming", "both"
+        self.label = label
+        self.limit = limit
+        # 需要返回的节点属性名列表，None 表示只返回名称
+        self.return_properties = return_properties
 
 
 class Neo4jUtils:
@@ -48,17 +143,126 @@ class Neo4jUtils:
         self.username = os.getenv('NEO4J_USERNAME', 'neo4j')
         self.password = os.getenv('NEO4J_PASSWORD', 'password')
         self.database = os.getenv('NEO4J_DATABASE', 'neo4j')
+        self.max_pool_size = int(os.getenv('NEO4J_MAX_POOL_SIZE', 100))
+        self.acquisition_timeout = float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', 60))
+        self.fetch_size = int(os.getenv('NEO4J_FETCH_SIZE', 1000))
+        # 多跳遍历的最大跳数、每跳最大节点数和事务超时，由数据库端强制执行
+        self.max_traversal_depth = int(os.getenv('NEO4J_MAX_TRAVERSAL_DEPTH', 4))
+        self.max_traversal_fanout = int(os.getenv('NEO4J_MAX_TRAVERSAL_FANOUT', 100))
+        self.traversal_timeout = float(os.getenv('NEO4J_TRAVERSAL_TIMEOUT', 5))
+        self._run_traversal = managed_transaction(timeout=self.traversal_timeout)(self._run)
+        
+        # 关系类型 -> (起点标签, 终点标签)，见 _relationship_labels
+        self._labels_by_relationship = {}
+        # 当前线程的工作单元会话，见 unit_of_work
+        self._local = threading.local()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'sessions_opened': 0,
+            'sessions_reused': 0,
+            'sessions_in_use': 0,
+            'sessions_in_use_peak': 0,
+            'read_transactions': 0,
+            'write_transactions': 0,
+            'acquisition_timeouts': 0,
+        }
         
         try:
             self.driver = GraphDatabase.driver(
                 self.uri, 
-                auth=(self.username, self.password)
+                auth=(self.username, self.password),
+                max_connection_pool_size=self.max_pool_size,
+                connection_acquisition_timeout=self.acquisition_timeout,
+                fetch_size=self.fetch_size
             )
-            info(f"Neo4j连接已建立: {self.uri}")
+            info(f"Neo4j连接已建立: {self.uri}, 连接池 {self.max_pool_size}")
         except Exception as e:
             error(f"Neo4j连接失败: {str(e)}")
             raise
     
+    def _count(self, name, delta=1):
+        with self._metrics_lock:
+            self._metrics[name] += delta
+            if name == 'sessions_in_use':
+                self._metrics['sessions_in_use_peak'] = max(
+                    self._metrics['sessions_in_use_peak'], self._metrics['sessions_in_use'])
+    
+    @contextmanager
+    def _session(self):
+        """
+        获取会话：处于 unit_of_work 中时复用其会话，否则新开一个
+        """
+        session = getattr(self._local, 'session', None)
+        if session is not None:
+            self._count('sessions_reused')
+            yield session
+            return
+        
+        try:
+            with self.driver.session(database=self.database) as session:
+                # 会话创建成功后才计入使用中
+                self._count('sessions_opened')
+                self._count('sessions_in_use')
+                try:
+                    yield session
+                finally:
+                    self._count('sessions_in_use', -1)
+        except ConnectionAcquisitionTimeoutError:
+            self._count('acquisition_timeouts')
+            raise
+    
+    @contextmanager
+    def unit_of_work(self):
+        """
+        工作单元：with 块内当前线程的所有查询共用同一个会话
+        
+        用法:
+            with graph_db_utils.unit_of_work():
+                graph_db_utils.find_nodes(...)
+                graph_db_utils.run_cypher(...)
+        """
+        if getattr(self._local, 'session', None) is not None:
+            yield self
+            return
+        
+        with self._session() as session:
+            self._local.session = session
+            try:
+                yield self
+            finally:
+                self._local.session = None
+    
+    def _execute_read(self, session, transaction_function, *args):
+        """托管读事务，瞬时错误由驱动自动重试"""
+        self._count('read_transactions')
+        return session.execute_read(transaction_function, *args)
+    
+    def _execute_write(self, session, transaction_function, *args):
+        """托管写事务，瞬时错误由驱动自动重试"""
+        self._count('write_transactions')
+        return session.execute_write(transaction_function, *args)
+    
+    def _read(self, session, query, parameters=None):
+        return self._execute_read(session, self._run, query, parameters)
+    
+    def _write(self, session, query, parameters=None):
+        return self._execute_write(session, self._run, query, parameters)
+    
+    @staticmethod
+    def _run(tx, query, parameters=None):
+        """事务函数：执行查询并在事务内取回全部记录"""
+        return list(tx.run(query, parameters or {}))
+    
+    def metrics(self):
+        """
+        连接池与会话使用指标
+        
+        sessions_in_use_peak 接近 max_pool_size 或 acquisition_timeouts 增长说明连接池不够用，
+        sessions_opened 远大于 sessions_reused 说明会话频繁开关。
+        """
+        with self._metrics_lock:
+            return {**self._metrics, 'max_pool_size': self.max_pool_size}
+    
     def create_node(self, label, properties=None):
         """
         创建节点
@@ -71,24 +275,19 @@ class Neo4jUtils:
             dict: 包含操作结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 if properties:
                     query = f"CREATE (n:{label} $properties) RETURN n"
-                    result = session.run(query, properties=properties)
                 else:
                     query = f"CREATE (n:{label}) RETURN n"
-                    result = session.run(query)
                 
-                record = result.single()
+                records = self._write(session, query, {'properties': properties})
+                record = records[0] if records else None
                 if record:
                     node = record['n']
                     return {
                         'success': True,
-                        'node': Node(
-                            id=node.id,
-                            labels=list(node.labels),
-                            properties=dict(node)
-                        )
+                        'node': Node.from_entity(node)
                     }
                 else:
                     return {'success': False, 'error': '节点创建失败'}
@@ -97,6 +296,179 @@ class Neo4jUtils:
             error(f"创建节点失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def create_nodes_bulk(self, label, rows, batch_size=1000):
+        """
+        批量创建节点
+        
+        使用参数化的 UNWIND $rows 按批写入，每批一个显式写事务，
+        代替逐个调用 create_node 的逐条往返。
+        
+        Args:
+            label (str): 节点标签
+            rows (list[dict]): 节点属性列表
+            batch_size (int): 每批写入的节点数量
+            
+        Returns:
+            dict: {'success': bool, 'nodes': list} 节点顺序与rows一致
+        """
+        rows = list(rows)
+        query = build_create_nodes_query(label)
+        nodes = []
+        try:
+            with self._session() as session:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    begin = time.perf_counter()
+                    ids = self._execute_write(session, self._write_batch, query, batch)
+                    self._log_batch_throughput(label, start // batch_size + 1, len(batch), begin)
+                    for node_id, properties in zip(ids, batch):
+                        nodes.append(Node(id=node_id, labels=[label], properties=properties))
+            return {'success': True, 'nodes': nodes}
+        except Exception as e:
+            error(f"批量创建节点失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'nodes': nodes}
+    
+    @staticmethod
+    def _write_batch(tx, query, batch):
+        """在写事务中执行一批 UNWIND 语句，按顺序返回id"""
+        return [record['id'] for record in tx.run(query, rows=batch)]
+    
+    @staticmethod
+    def _log_batch_throughput(name, batch_no, count, begin):
+        """输出单批写入的吞吐量"""
+        elapsed = time.perf_counter() - begin
+        rate = count / elapsed if elapsed > 0 else float('inf')
+        info(f"批量写入 {name}: 第 {batch_no} 批 {count} 条, 耗时 {elapsed:.3f}s, {rate:.0f} 条/秒")
+    
+    def merge_nodes_bulk(self, label, rows, batch_size=1000):
+        """
+        按 name 批量合并节点（存在则以 row 整体替换属性，只保留 uid；不存在则创建）
+        
+        Args:
+            label (str): 节点标签
+            rows (list[dict]): 节点属性列表，必须包含 name
+            batch_size (int): 每批写入的节点数量
+            
+        Returns:
+            dict: {'success': bool, 'nodes': list, 'created': list}
+                created 为本次新建的节点
+        """
+        rows = list(rows)
+        nodes = []
+        created = []
+        try:
+            with self._session() as session:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    begin = time.perf_counter()
+                    ids, existing = self._execute_write(session, self._merge_batch, label, batch)
+                    self._log_batch_throughput(label, start // batch_size + 1, len(batch), begin)
+                    for node_id, properties in zip(ids, batch):
+                        node = Node(id=node_id, labels=[label], properties=properties)
+                        nodes.append(node)
+                        if properties['name'] not in existing:
+                            created.append(node)
+            return {'success': True, 'nodes': nodes, 'created': created}
+        except Exception as e:
+            error(f"批量合并节点失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'nodes': nodes, 'created': created}
+    
+    @staticmethod
+    def _merge_batch(tx, label, batch):
+        """在写事务中合并一批节点，返回 (按顺序的id, 合并前已存在的name集合)"""
+        names = [row['name'] for row in batch]
+        existing = {record['name'] for record in tx.run(
+            f"MATCH (n:{label}) WHERE n.name IN $names RETURN n.name AS name", names=names)}
+        result = tx.run(
+            f"UNWIND $rows AS row MERGE (n:{label} {{name: row.name}}) "
+            f"WITH n, row, n.uid AS uid SET n = row SET n.uid = uid RETURN id(n) AS id",
+            rows=batch)
+        return [record['id'] for record in result], existing
+    
+    def delete_nodes_bulk(self, label, names, batch_size=1000):
+        """
+        按 name 批量删除节点及其所有关系
+        
+        Args:
+            label (str): 节点标签
+            names (list[str]): 节点名称列表
+            batch_size (int): 每批删除的节点数量
+            
+        Returns:
+            dict: {'success': bool, 'ids': list} 被删除节点的id
+        """
+        names = list(names)
+        query = f"UNWIND $names AS name MATCH (n:{label} {{name: name}}) WITH n, id(n) AS id DETACH DELETE n RETURN id"
+        ids = []
+        try:
+            with self._session() as session:
+                for start in range(0, len(names), batch_size):
+                    ids += self._execute_write(
+                        session, lambda tx, batch: [record['id'] for record in tx.run(query, names=batch)],
+                        names[start:start + batch_size])
+            info(f"批量删除 {len(ids)} 个节点: {label}")
+            return {'success': True, 'ids': ids}
+        except Exception as e:
+            error(f"批量删除节点失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'ids': ids}
+    
+    def delete_orphan_nodes(self, label):
+        """
+        删除没有任何关系的孤立节点
+        
+        Args:
+            label (str): 节点标签
+            
+        Returns:
+            dict: {'success': bool, 'ids': list, 'names': list} 被删除节点的id和名称
+        """
+        query = f"MATCH (n:{label}) WHERE NOT (n)--() WITH n, id(n) AS id, n.name AS name DELETE n RETURN id, name"
+        try:
+            with self._session() as session:
+                records = self._execute_write(session, lambda tx: [(record['id'], record['name']) for record in tx.run(query)])
+            info(f"删除 {len(records)} 个孤立节点: {label}")
+            return {'success': True, 'ids': [record[0] for record in records], 'names': [record[1] for record in records]}
+        except Exception as e:
+            error(f"删除孤立节点失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'ids': [], 'names': []}
+    
+    def update_specificity_weights(self, from_label, relationship_type, to_label, weight_property,
+                                   degree_property):
+        """
+        预计算关系两端的排序统计
+        
+        起始节点写入类IDF权重 ln((N + 1) / (df + 1)) + 1，其中 N 为目标节点总数、df 为该节点关联的目标节点数，
+        关联越多（越常见）权重越低；目标节点写入其关联的起始节点数。
+        
+        Args:
+            from_label (str): 起始节点标签
+            relationship_type (str): 关系类型
+            to_label (str): 目标节点标签
+            weight_property (str): 起始节点上的权重属性名
+            degree_property (str): 目标节点上的度数属性名
+            
+        Returns:
+            dict: {'success': bool, 'total': int} total 为目标节点总数
+        """
+        try:
+            with self._session() as session:
+                total = self._read(session, f"MATCH (d:{to_label}) RETURN count(d) AS total")[0]['total']
+                self._write(session, f"""
+                MATCH (s:{from_label})
+                WITH s, size([(s)-[:{relationship_type}]->(:{to_label}) | 1]) AS df
+                SET s.{weight_property} = log(($total + 1.0) / (df + 1.0)) + 1.0
+                """, {'total': total})
+                self._write(session, f"""
+                MATCH (d:{to_label})
+                SET d.{degree_property} = size([(:{from_label})-[:{relationship_type}]->(d) | 1])
+                """)
+            info(f"排序统计已更新: {from_label}.{weight_property}, {to_label}.{degree_property}, "
+                 f"{to_label} 共 {total} 个")
+            return {'success': True, 'total': total}
+        except Exception as e:
+            error(f"更新排序统计失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     def find_node(self, label, properties=None):
         """
         查找单个节点
@@ -109,26 +481,21 @@ class Neo4jUtils:
             dict: 包含节点信息或None的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 if properties:
                     where_clause = " AND ".join([f"n.{key} = ${key}" for key in properties.keys()])
-                    query = f"MATCH (n:{label}) WHERE {where_clause} RETURN n"
-                    result = session.run(query, **properties)
+                    query = f"MATCH (n:{label}) WHERE {where_clause} RETURN n LIMIT 1"
                 else:
                     query = f"MATCH (n:{label}) RETURN n LIMIT 1"
-                    result = session.run(query)
                 
-                record = result.single()
+                records = self._read(session, query, properties)
+                record = records[0] if records else None
                 if record:
                     node = record['n']
                     info(f"找到节点: {label}")
                     return {
                         'success': True,
-                        'node': Node(
-                            id=node.id,
-                            labels=list(node.labels),
-                            properties=dict(node)
-                        )
+                        'node': Node.from_entity(node)
                     }
                 else:
                     return {'success': True, 'node': None}
@@ -137,7 +504,7 @@ class Neo4jUtils:
             error(f"查找节点失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def find_nodes(self, label, properties=None, limit=None):
+    def find_nodes(self, label, properties=None, limit=None, raw=False):
         """
         查找多个节点
         
@@ -145,12 +512,13 @@ class Neo4jUtils:
             label (str): 节点标签
             properties (dict, optional): 匹配属性
             limit (int, optional): 限制返回数量
+            raw (bool): 为 True 时不构造 Node，直接在 'rows' 中返回驱动的记录
             
         Returns:
             dict: 包含节点列表的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 if properties:
                     where_clause = " AND ".join([f"n.{key} = ${key}" for key in properties.keys()])
                     query = f"MATCH (n:{label}) WHERE {where_clause} RETURN n"
@@ -160,16 +528,15 @@ class Neo4jUtils:
                 if limit:
                     query += f" LIMIT {limit}"
                 
-                result = session.run(query, **properties if properties else {})
+                result = self._read(session, query, properties)
+                if raw:
+                    info(f"找到 {len(result)} 个节点: {label}")
+                    return {'success': True, 'rows': result}
                 nodes = []
                 
                 for record in result:
                     node = record['n']
-                    nodes.append(Node(
-                        id=node.id,
-                        labels=list(node.labels),
-                        properties=dict(node)
-                    ))
+                    nodes.append(Node.from_entity(node))
                 
                 info(f"找到 {len(nodes)} 个节点: {label}")
                 return {'success': True, 'nodes': nodes}
@@ -191,26 +558,22 @@ class Neo4jUtils:
             dict: 包含操作结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 where_clause = " AND ".join([f"n.{key} = ${key}" for key in match_properties.keys()])
                 set_clause = ", ".join([f"n.{key} = ${key}" for key in update_properties.keys()])
                 
                 query = f"MATCH (n:{label}) WHERE {where_clause} SET {set_clause} RETURN n"
                 parameters = {**match_properties, **update_properties}
                 
-                result = session.run(query, **parameters)
-                record = result.single()
+                records = self._write(session, query, parameters)
+                record = records[0] if records else None
                 
                 if record:
                     node = record['n']
                     info(f"成功更新节点: {label}")
                     return {
                         'success': True,
-                        'node': Node(
-                            id=node.id,
-                            labels=list(node.labels),
-                            properties=dict(node)
-                        )
+                        'node': Node.from_entity(node)
                     }
                 else:
                     return {'success': False, 'error': '未找到匹配的节点'}
@@ -231,12 +594,12 @@ class Neo4jUtils:
             dict: 包含操作结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 where_clause = " AND ".join([f"n.{key} = ${key}" for key in properties.keys()])
                 query = f"MATCH (n:{label}) WHERE {where_clause} DETACH DELETE n RETURN count(n) as deleted_count"
                 
-                result = session.run(query, **properties)
-                record = result.single()
+                records = self._write(session, query, properties)
+                record = records[0] if records else None
                 
                 if record and record['deleted_count'] > 0:
                     info(f"成功删除 {record['deleted_count']} 个节点: {label}")
@@ -265,7 +628,7 @@ class Neo4jUtils:
             dict: 包含操作结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 # 处理from_node参数格式
                 if isinstance(from_node, Node):
                     # 如果是Node对象
@@ -326,19 +689,15 @@ class Neo4jUtils:
                 RETURN r
                 """
                 
-                result = session.run(query, **query_params)
-                record = result.single()
+                records = self._write(session, query, query_params)
+                record = records[0] if records else None
                 
                 if record:
                     rel = record['r']
                     info(f"成功创建关系: {relationship_type}")
                     return {
                         'success': True,
-                        'relationship': Relationship(
-                            id=rel.id,
-                            type=rel.type,
-                            properties=dict(rel)
-                        )
+                        'relationship': Relationship.from_entity(rel)
                     }
                 else:
                     return {'success': False, 'error': '未找到匹配的节点'}
@@ -347,7 +706,137 @@ class Neo4jUtils:
             error(f"创建关系失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def find_relationships(self, from_node=None, relationship_type=None, to_node=None):
+    def ensure_name_indexes(self, labels, unique=True):
+        """
+        确保各标签的 name 属性上存在唯一约束或索引
+        
+        唯一约束自带索引；若已有重复数据导致约束创建失败，退回为普通索引，
+        保证 MATCH (n:Label {name: ...}) 不再走全标签扫描。
+        
+        Args:
+            labels (list[str]): 节点标签列表
+            unique (bool): 是否优先创建唯一约束
+            
+        Returns:
+            dict: {'success': bool, 'constraints': list, 'indexes': list}
+        """
+        constraints = []
+        indexes = []
+        try:
+            with self._session() as session:
+                for label in labels:
+                    if unique:
+                        try:
+                            session.run(
+                                f"CREATE CONSTRAINT {label.lower()}_name_unique IF NOT EXISTS "
+                                f"FOR (n:{label}) REQUIRE n.name IS UNIQUE").consume()
+                            constraints.append(label)
+                            continue
+                        except Exception as e:
+                            error(f"创建唯一约束失败, 改为普通索引: {label}, {str(e)}")
+                    session.run(
+                        f"CREATE INDEX {label.lower()}_name_index IF NOT EXISTS "
+                        f"FOR (n:{label}) ON (n.name)").consume()
+                    indexes.append(label)
+                session.run("CALL db.awaitIndexes()").consume()
+            info(f"name索引就绪: 唯一约束 {constraints}, 普通索引 {indexes}")
+            return {'success': True, 'constraints': constraints, 'indexes': indexes}
+        except Exception as e:
+            error(f"创建索引失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def create_relationships_bulk(self, from_label, relationship_type, to_label, edges,
+                                  properties=None, batch_size=1000):
+        """
+        批量创建关系
+        
+        按 name 索引查找两端节点，以 UNWIND + MERGE 按批写入，每批一个写事务。
+        名称不唯一时（如同名疾病）与同名的每个节点都建立关系，同一对节点只建一条；
+        created 按关系行计数，与同名节点个数无关。
+        找不到端点的行、整批失败的行或连接失败后未写入的行会被收集返回，而不是逐条打印。
+        
+        Args:
+            from_label (str): 起始节点标签
+            relationship_type (str): 关系类型
+            to_label (str): 目标节点标签
+            edges (list): [起始节点name, 目标节点name] 列表
+            properties (dict, optional): 关系属性
+            batch_size (int): 每批写入的关系数量
+            
+        Returns:
+            dict: {'success': bool, 'created': int, 'failed': list}
+                failed 中每项为 {'edge': [from, to], 'error': str}
+        """
+        edges = list(edges)
+        query = build_merge_edges_query(from_label, relationship_type, to_label)
+        created = 0
+        failed = []
+        processed = 0
+        try:
+            with self._session() as session:
+                for start in range(0, len(edges), batch_size):
+                    batch = [list(edge) for edge in edges[start:start + batch_size]]
+                    processed = start + len(batch)
+                    begin = time.perf_counter()
+                    try:
+                        rows = self._execute_write(
+                            session, self._write_edge_batch, query, batch, properties or {})
+                    except Exception as e:
+                        failed.extend({'edge': edge, 'error': str(e)} for edge in batch)
+                        continue
+                    for row, ok in rows:
+                        if ok:
+                            created += 1
+                        else:
+                            failed.append({'edge': row, 'error': '未找到匹配的节点'})
+                    self._log_batch_throughput(relationship_type, start // batch_size + 1, len(batch), begin)
+        except Exception as e:
+            # 获取会话失败等：尚未写入的关系全部记为失败
+            failed.extend({'edge': list(edge), 'error': str(e)} for edge in edges[processed:])
+        
+        if failed:
+            error(f"批量创建关系 {relationship_type}: {len(failed)} 条失败")
+        info(f"批量创建关系 {relationship_type}: 成功 {created} 条")
+        return {'success': not failed, 'created': created, 'failed': failed}
+    
+    @staticmethod
+    def _write_edge_batch(tx, query, batch, properties):
+        """在写事务中执行一批关系写入，返回 (row, ok) 列表"""
+        result = tx.run(query, rows=batch, properties=properties)
+        return [(record['row'], record['ok']) for record in result]
+    
+    def delete_relationships_bulk(self, label, names, relationship_types, direction="outgoing", batch_size=1000):
+        """
+        批量删除指定节点上某几类关系
+        
+        Args:
+            label (str): 节点标签
+            names (list[str]): 节点名称列表
+            relationship_types (list[str]): 关系类型列表
+            direction (str): "outgoing" 或 "incoming"
+            batch_size (int): 每批处理的节点数量
+            
+        Returns:
+            dict: {'success': bool, 'deleted_count': int}
+        """
+        names = list(names)
+        rel_types = "|".join(relationship_types)
+        pattern = f"-[r:{rel_types}]->()" if direction == "outgoing" else f"<-[r:{rel_types}]-()"
+        query = f"UNWIND $names AS name MATCH (n:{label} {{name: name}}){pattern} DELETE r RETURN count(r) AS deleted_count"
+        deleted_count = 0
+        try:
+            with self._session() as session:
+                for start in range(0, len(names), batch_size):
+                    deleted_count += self._execute_write(
+                        session, lambda tx, batch: tx.run(query, names=batch).single()['deleted_count'],
+                        names[start:start + batch_size])
+            info(f"批量删除 {deleted_count} 个关系: {rel_types}")
+            return {'success': True, 'deleted_count': deleted_count}
+        except Exception as e:
+            error(f"批量删除关系失败: {str(e)}")
+            return {'success': False, 'error': str(e), 'deleted_count': deleted_count}
+    
+    def find_relationships(self, from_node=None, relationship_type=None, to_node=None, raw=False):
         """
         查找关系
         
@@ -355,12 +844,13 @@ class Neo4jUtils:
             from_node (dict, optional): 起始节点信息
             relationship_type (str, optional): 关系类型
             to_node (dict, optional): 目标节点信息
+            raw (bool): 为 True 时不构造 Relationship，直接在 'rows' 中返回驱动的记录
             
         Returns:
             dict: 包含关系列表的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 # 构建查询条件
                 where_parts = []
                 params = {}
@@ -417,16 +907,15 @@ class Neo4jUtils:
                 
                 query += " RETURN r"
                 
-                result = session.run(query, **params)
+                result = self._read(session, query, params)
+                if raw:
+                    info(f"找到 {len(result)} 个关系")
+                    return {'success': True, 'rows': result}
                 relationships = []
                 
                 for record in result:
                     rel = record['r']
-                    relationships.append(Relationship(
-                            id=rel.id,
-                            type=rel.type,
-                            properties=dict(rel)
-                        ))
+                    relationships.append(Relationship.from_entity(rel))
                 
                 info(f"找到 {len(relationships)} 个关系")
                 return {'success': True, 'relationships': relationships}
@@ -435,140 +924,157 @@ class Neo4jUtils:
             error(f"查找关系失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def find_nodes_by_condition(self, source_condition, relationship_condition=None, target_condition=None):
+    def find_nodes_by_condition(self, source_condition, relationship_condition=None, target_condition=None,
+                                returns=("a", "r", "b"), raw=False):
         """
         统一的节点查询方法 - 消除所有特殊情况
         
+        未指定标签的源、目标节点会按关系类型推断标签，使 name 条件可以走索引。
+        
         Args:
             source_condition: QueryCondition - 源节点查询条件
             relationship_condition: QueryCondition - 关系查询条件
             target_condition: QueryCondition - 目标节点查询条件（可选）
+            returns: 需要返回的元素，"a" 源节点、"r" 关系、"b" 目标节点；
+                各条件的 return_properties 决定只返回哪些属性
+            raw: 为 True 时不构造 Node/Relationship，直接返回驱动的记录，
+                每行的列顺序与 build_condition_query 的 RETURN 子句一致
         
         Returns:
-            dict: {'success': bool, 'nodes': list, 'relationships': list}
+            dict: {'success': bool, 'nodes': list, 'relationships': list}，raw 时为 {'success': bool, 'rows': list}
         """
         try:
-            with self.driver.session(database=self.database) as session:
-                # 构建源节点匹配条件
-                source_label = f":{source_condition.label}" if source_condition.label else ""
-                source_props = self._build_property_conditions(source_condition.properties, "a")
-                
-                # 构建关系匹配条件
+            with self._session() as session:
                 if relationship_condition and relationship_condition.relationship_type:
-                    rel_type = f":{relationship_condition.relationship_type}"
-                    rel_props = self._build_property_conditions(relationship_condition.properties, "r")
-                    
-                    # 根据方向构建查询
-                    if relationship_condition.direction == "outgoing":
-                        relationship_pattern = f"-[r{rel_type}]->"
-                    elif relationship_condition.direction == "incoming":
-                        relationship_pattern = f"<-[r{rel_type}]-"
-                    else:  # both
-                        relationship_pattern = f"-[r{rel_type}]-"
-                else:
-                    relationship_pattern = "-[r]->"
-                    rel_props = ""
-                
-                # 构建目标节点匹配条件
-                if target_condition:
-                    target_label = f":{target_condition.label}" if target_condition.label else ""
-                    target_props = self._build_property_conditions(target_condition.properties, "b")
-                    target_pattern = f"(b{target_label})"
-                    return_target = "RETURN a, r, b"
-                else:
-                    target_pattern = "(b)"
-                    target_props = ""
-                    return_target = "RETURN a, r, b"
-                
-                # 构建完整查询
-                where_conditions = []
-                if source_props:
-                    where_conditions.append(source_props)
-                if rel_props:
-                    where_conditions.append(rel_props)
-                if target_props:
-                    where_conditions.append(target_props)
-                
-                where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-                
-                query = f"MATCH (a{source_label}){relationship_pattern}{target_pattern}{where_clause} {return_target}"
-                
-                # 构建参数字典
-                params = {}
-                for key, value in source_condition.properties.items():
-                    params[f"a_{key}"] = value
-                if relationship_condition and relationship_condition.properties:
-                    for key, value in relationship_condition.properties.items():
-                        params[f"r_{key}"] = value
-                if target_condition and target_condition.properties:
-                    for key, value in target_condition.properties.items():
-                        params[f"b_{key}"] = value
-                
-                result = session.run(query, params)
-                nodes = []
-                relationships = []
-                
-                for record in result:
-                    # 添加源节点
-                    if record['a']:
-                        nodes.append(Node(
-                            id=record['a'].id,
-                            labels=list(record['a'].labels),
-                            properties=dict(record['a'])
-                        ))
-                    
-                    # 添加关系
-                    if record['r']:
-                        relationships.append(Relationship(
-                            id=record['r'].id,
-                            type=record['r'].type,
-                            properties=dict(record['r'])
-                        ))
-                    
-                    # 添加目标节点
-                    if record['b']:
-                        nodes.append(Node(
-                            id=record['b'].id,
-                            labels=list(record['b'].labels),
-                            properties=dict(record['b'])
-                        ))
-                
+                    source_condition, target_condition = apply_relationship_labels(
+                        source_condition, relationship_condition, target_condition,
+                        *self._relationship_labels(session, relationship_condition.relationship_type))
+                query, params = build_condition_query(
+                    source_condition, relationship_condition, target_condition, returns)
+                records = self._read(session, query, params)
+                if raw:
+                    return {'success': True, 'rows': records}
+                nodes, relationships = records_to_graph(records, returns)
                 return {'success': True, 'nodes': nodes, 'relationships': relationships}
                 
         except Exception as e:
             error(f"查询节点失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def _relationship_labels(self, session, relationship_type):
+        """
+        推断关系两端的节点标签 (起点标签, 终点标签)，按关系类型缓存
+        
+        先按 EDGE_KINDS 的静态定义推断，只有唯一一种组合时才加标签
+        （如 belongs_to 同时连接 Department->Department 和 Disease->Department，不加标签）；
+        EDGE_KINDS 中没有的关系类型才查询图中的全部标签组合（需扫描该类型的所有关系），
+        图中还没有该类型的关系时不缓存
+        """
+        labels = schema_relationship_labels(relationship_type)
+        if labels is not None:
+            return labels
+        if relationship_type not in self._labels_by_relationship:
+            records = self._read(
+                session,
+                f"MATCH (a)-[:{relationship_type}]->(b) RETURN DISTINCT labels(a) AS start, labels(b) AS end LIMIT 2")
+            if not records:
+                return None, None
+            self._labels_by_relationship[relationship_type] = infer_relationship_labels(records)
+        return self._labels_by_relationship[relationship_type]
+    
     def _build_property_conditions(self, properties, alias):
         """构建属性匹配条件"""
-        if not properties:
-            return ""
-        conditions = []
-        for key, value in properties.items():
-            conditions.append(f"{alias}.{key} = ${alias}_{key}")
-        return " AND ".join(conditions)
+        return build_property_conditions(properties, alias)
 
-    def find_node_by_relationship(self, relationship_type, front_node_name):
+    def traverse(self, start_label, names, hops):
+        """
+        有界的多跳遍历 - 一次查询完成
+        
+        每一跳把上一跳保留的全部节点作为一批起点一起扩展，按被起点命中的次数排序，
+        只保留前 limit 个节点进入下一跳；已访问过的节点不会重复出现。
+        跳数超过 max_traversal_depth 时拒绝执行，每跳的 limit 不超过 max_traversal_fanout，
+        查询受 traversal_timeout 事务超时约束。
+        
+        Args:
+            start_label (str): 起始节点标签
+            names (list[str]): 起始节点名称列表
+            hops (list[TraversalHop]): 每一跳的关系类型、方向、目标标签和节点数上限
+            
+        Returns:
+            dict: {'success': bool, 'hops': list}
+                hops 中每项为该跳的节点列表 [{'name': str, 'count': int, 'sources': list, 'properties': dict}]
+        """
+        if not hops or len(hops) > self.max_traversal_depth:
+            error(f"遍历跳数 {len(hops)} 超出范围 1~{self.max_traversal_depth}")
+            return {'success': False, 'error': f"遍历跳数需在 1~{self.max_traversal_depth} 之间"}
+        
+        query = build_traversal_query(start_label, hops)
+        params = {'names': list(names)}
+        for i, hop in enumerate(hops, 1):
+            params[f"limit{i}"] = min(hop.limit, self.max_traversal_fanout)
+        try:
+            with self._session() as session:
+                records = self._execute_read(session, self._run_traversal, query, params)
+            record = records[0]
+            return {'success': True, 'hops': [record[f"hop{i}"] for i in range(1, len(hops) + 1)]}
+        except Exception as e:
+            error(f"多跳遍历失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
+    def find_node_by_relationship(self, relationship_type, front_node_name, front_node_label=None,
+                                  properties=None):
         """
         根据关系类型和属性查找节点 - 向后兼容方法
+        
+        只返回目标节点；properties 为需要返回的目标节点属性名列表，默认返回全部属性
         """
         # 使用新的统一查询方法
-        source_condition = QueryCondition(properties={"name": front_node_name})
+        source_condition = QueryCondition(label=front_node_label, properties={"name": front_node_name})
         relationship_condition = QueryCondition(relationship_type=relationship_type, direction="outgoing")
+        target_condition = QueryCondition(return_properties=properties)
         
-        result = self.find_nodes_by_condition(source_condition, relationship_condition)
+        result = self.find_nodes_by_condition(
+            source_condition, relationship_condition, target_condition, returns=("b",))
         
         if result['success']:
-            # 只返回目标节点（通过关系连接的节点）
-            target_nodes = []
-            for node in result['nodes']:
-                # 过滤掉源节点，只保留目标节点
-                if node.properties.get('name') != front_node_name:
-                    target_nodes.append(node)
-            return {'success': True, 'nodes': target_nodes}
+            return {'success': True, 'nodes': result['nodes']}
         else:
             return result
     
+    def rank_related_nodes(self, from_label, names, relationship_type, to_label, limit, with_properties=True,
+                           weight_property=None, degree_property=None):
+        """
+        按关联次数排序的邻居节点查询 - 一次往返完成
+        
+        UNWIND 全部起始节点名称，在数据库中按目标节点聚合命中次数并排序，
+        只返回前 limit 个目标节点。
+        
+        Args:
+            from_label (str): 起始节点标签
+            names (list[str]): 起始节点名称列表
+            relationship_type (str): 关系类型
+            to_label (str): 目标节点标签
+            limit (int): 返回的目标节点数量
+            with_properties (bool): 是否返回目标节点的全部属性
+            weight_property (str, optional): 起始节点的权重属性，指定后按权重之和排序，
+                见 update_specificity_weights；缺少权重的节点按 1 计
+            degree_property (str, optional): 目标节点的度数属性，同分时度数小的优先
+            
+        Returns:
+            dict: {'success': bool, 'records': list}
+                records 中每项为 {'name': str, 'count': int, 'score': float, 'properties': dict}
+        """
+        query = build_rank_query(from_label, relationship_type, to_label, with_properties,
+                                 weight_property, degree_property)
+        try:
+            with self._session() as session:
+                records = [record.data() for record in self._read(
+                    session, query, {'names': list(names), 'limit': limit})]
+            return {'success': True, 'records': records}
+        except Exception as e:
+            error(f"查询关联节点排名失败: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     def delete_relationship(self, from_node, relationship_type, to_node):
         """
         删除指定关系
@@ -582,7 +1088,7 @@ class Neo4jUtils:
             dict: 包含操作结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
+            with self._session() as session:
                 from_where = " AND ".join([f"a.{key} = ${key}" for key in from_node['properties'].keys()])
                 to_where = " AND ".join([f"b.{key} = ${key}" for key in to_node['properties'].keys()])
                 
@@ -594,8 +1100,8 @@ class Neo4jUtils:
                 """
                 
                 params = {**from_node['properties'], **to_node['properties']}
-                result = session.run(query, **params)
-                record = result.single()
+                records = self._write(session, query, params)
+                record = records[0] if records else None
                 
                 if record and record['deleted_count'] > 0:
                     info(f"成功删除 {record['deleted_count']} 个关系: {relationship_type}")
@@ -607,35 +1113,120 @@ class Neo4jUtils:
             error(f"删除关系失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
-    def delete_all_nodes_and_relationships(self):
+    def delete_all_nodes_and_relationships(self, chunk_size=None, drop_schema=False):
         """
         删除所有节点和关系
+        
+        Args:
+            chunk_size (int, optional): 分批删除时每个事务删除的数量；
+                为空时使用单条 DETACH DELETE，数据量大时会产生超大事务
+            drop_schema (bool): 删除前先删掉索引和约束，结束后（删除失败时也一样）按原语句重建
+            
+        Returns:
+            dict: {'success': bool, 'deleted_relationships': int, 'deleted_nodes': int}
         """
         try:
-            with self.driver.session(database=self.database) as session:
-                session.run("MATCH (n) DETACH DELETE n")
+            with self._session() as session:
+                schema = self._schema_statements(session) if drop_schema else []
+                try:
+                    self._drop_schema(session, schema)
+                    
+                    if chunk_size:
+                        # 先分批删关系再分批删节点，避免超级节点让单个事务过大
+                        deleted_relationships = self._delete_in_chunks(
+                            session, "关系",
+                            "MATCH ()-[r]->() RETURN count(r) AS total",
+                            "MATCH ()-[r]->() WITH r LIMIT $chunk_size DELETE r RETURN count(*) AS deleted",
+                            chunk_size)
+                        deleted_nodes = self._delete_in_chunks(
+                            session, "节点",
+                            "MATCH (n) RETURN count(n) AS total",
+                            "MATCH (n) WITH n LIMIT $chunk_size DETACH DELETE n RETURN count(*) AS deleted",
+                            chunk_size)
+                    else:
+                        summary = session.run("MATCH (n) DETACH DELETE n").consume()
+                        deleted_relationships = summary.counters.relationships_deleted
+                        deleted_nodes = summary.counters.nodes_deleted
+                finally:
+                    self._restore_schema(session, schema)
     
                 info("成功删除所有节点和关系")
-                return {'success': True}
+                return {'success': True, 'deleted_relationships': deleted_relationships, 'deleted_nodes': deleted_nodes}
         except Exception as e:
             error(f"删除所有节点和关系失败: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    def _delete_in_chunks(self, session, name, count_query, delete_query, chunk_size):
+        """循环执行分批删除语句直到删完，每批一个写事务并输出进度"""
+        total = session.run(count_query).single()['total']
+        deleted = 0
+        begin = time.perf_counter()
+        while True:
+            count = self._execute_write(
+                session, lambda tx: tx.run(delete_query, chunk_size=chunk_size).single()['deleted'])
+            if count == 0:
+                break
+            deleted += count
+            info(f"删除{name}: {deleted}/{total}, 耗时 {time.perf_counter() - begin:.1f}s")
+        return deleted
+    
+    @staticmethod
+    def _schema_statements(session):
+        """
+        Returns:
+            list: [(类型, 名称, 重建语句)]，先约束后索引，约束自带的索引不单独列出
+        """
+        constraints = session.run(
+            "SHOW CONSTRAINTS YIELD name, createStatement RETURN name, createStatement").data()
+        indexes = session.run(
+            "SHOW INDEXES YIELD name, type, owningConstraint, createStatement "
+            "WHERE type <> 'LOOKUP' AND owningConstraint IS NULL "
+            "RETURN name, createStatement").data()
+        return ([('CONSTRAINT', item['name'], item['createStatement']) for item in constraints]
+                + [('INDEX', item['name'], item['createStatement']) for item in indexes])
+    
+    @staticmethod
+    def _drop_schema(session, schema):
+        """删除 _schema_statements 列出的约束和索引"""
+        for kind, name, _ in schema:
+            session.run(f"DROP {kind} `{name}` IF EXISTS").consume()
+        if schema:
+            info(f"已删除 {len(schema)} 个索引和约束")
     
-    def run_cypher(self, query, parameters=None):
+    @staticmethod
+    def _restore_schema(session, schema):
+        """
+        按原语句重建约束和索引，逐条执行，已存在（未被删掉）或单条失败不影响其余语句
+        """
+        restored = 0
+        for kind, name, statement in schema:
+            try:
+                session.run(statement).consume()
+                restored += 1
+            except Exception as e:
+                error(f"重建{kind} {name} 失败: {str(e)}")
+        if restored:
+            session.run("CALL db.awaitIndexes()").consume()
+            info(f"已重建 {restored}/{len(schema)} 个索引和约束")
+    
+    def run_cypher(self, query, parameters=None, write=True):
         """
         执行自定义Cypher查询
         
         Args:
             query (str): Cypher查询语句
             parameters (dict, optional): 查询参数
+            write (bool): 是否为写操作，默认使用托管写事务；只读查询传 False 走读事务（可路由到从库）
             
         Returns:
             dict: 包含查询结果的字典
         """
         try:
-            with self.driver.session(database=self.database) as session:
-                result = session.run(query, parameters or {})
+            with self._session() as session:
+                if write:
+                    result = self._write(session, query, parameters)
+                else:
+                    result = self._read(session, query, parameters)
                 records = []
                 
                 for record in result:
@@ -658,3 +1249,254 @@ class Neo4jUtils:
                 info("Neo4j连接已关闭")
         except Exception as e:
             error(f"关闭Neo4j连接失败: {str(e)}")
+
+
+def build_property_conditions(properties, alias):
+    """构建属性匹配条件，参数名为 {alias}_{key}"""
+    if not properties:
+        return ""
+    conditions = []
+    for key, value in properties.items():
+        conditions.append(f"{alias}.{key} = ${alias}_{key}")
+    return " AND ".join(conditions)
+
+
+def schema_relationship_labels(relationship_type):
+    """
+    由 EDGE_KINDS 推断关系两端的标签
+
+    Returns:
+        tuple: (起点标签, 终点标签)，组合不唯一时为 (None, None)；未定义的关系类型返回 None
+    """
+    pairs = SCHEMA_LABEL_PAIRS.get(relationship_type)
+    if pairs is None:
+        return None
+    return next(iter(pairs)) if len(pairs) == 1 else (None, None)
+
+
+def infer_relationship_labels(records):
+    """
+    由关系两端的 DISTINCT 标签组合推断 (起点标签, 终点标签)
+    
+    Returns:
+        tuple: 只有唯一组合时为该组合中的单标签，否则对应位置为 None
+    """
+    if len(records) != 1:
+        return None, None
+    start, end = records[0]['start'], records[0]['end']
+    return start[0] if len(start) == 1 else None, end[0] if len(end) == 1 else None
+
+
+def apply_relationship_labels(source_condition, relationship_condition, target_condition, start_label, end_label):
+    """
+    按关系方向，为未指定标签的源、目标节点条件补上关系两端的标签
+    
+    Returns:
+        tuple: (source_condition, target_condition)，有改动时返回副本
+    """
+    if relationship_condition.direction == "outgoing":
+        source_label, target_label = start_label, end_label
+    elif relationship_condition.direction == "incoming":
+        source_label, target_label = end_label, start_label
+    else:  # both，只有两端标签相同时才能确定
+        source_label = target_label = start_label if start_label == end_label else None
+    
+    if source_condition.label is None and source_label:
+        source_condition = copy.copy(source_condition)
+        source_condition.label = source_label
+    if target_condition is None:
+        target_condition = QueryCondition(label=target_label)
+    elif target_condition.label is None and target_label:
+        target_condition = copy.copy(target_condition)
+        target_condition.label = target_label
+    return source_condition, target_condition
+
+
+def build_return_clause(alias, condition, is_relationship=False):
+    """返回完整元素，或只返回 id、标签/类型和指定属性"""
+    if condition is None or condition.return_properties is None:
+        return alias
+    projection = ", ".join(f".{key}" for key in condition.return_properties)
+    kind = f"type({alias}) AS {alias}_type" if is_relationship else f"labels({alias}) AS {alias}_labels"
+    return f"id({alias}) AS {alias}_id, {kind}, {alias} {{{projection}}} AS {alias}_properties"
+
+
+def build_condition_query(source_condition, relationship_condition=None, target_condition=None,
+                          returns=("a", "r", "b")):
+    """
+    根据 QueryCondition 构建 MATCH (a)-[r]->(b) 查询
+    
+    Returns:
+        tuple: (query, params)
+    """
+    # 构建源节点匹配条件
+    source_label = f":{source_condition.label}" if source_condition.label else ""
+    source_props = build_property_conditions(source_condition.properties, "a")
+    
+    # 构建关系匹配条件
+    if relationship_condition and relationship_condition.relationship_type:
+        rel_type = f":{relationship_condition.relationship_type}"
+        rel_props = build_property_conditions(relationship_condition.properties, "r")
+        
+        # 根据方向构建查询
+        if relationship_condition.direction == "outgoing":
+            relationship_pattern = f"-[r{rel_type}]->"
+        elif relationship_condition.direction == "incoming":
+            relationship_pattern = f"<-[r{rel_type}]-"
+        else:  # both
+            relationship_pattern = f"-[r{rel_type}]-"
+    else:
+        relationship_pattern = "-[r]->"
+        rel_props = ""
+    
+    # 构建目标节点匹配条件
+    if target_condition:
+        target_label = f":{target_condition.label}" if target_condition.label else ""
+        target_props = build_property_conditions(target_condition.properties, "b")
+        target_pattern = f"(b{target_label})"
+    else:
+        target_pattern = "(b)"
+        target_props = ""
+    
+    # 构建完整查询
+    where_conditions = [condition for condition in (source_props, rel_props, target_props) if condition]
+    where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    
+    conditions = {"a": source_condition, "r": relationship_condition, "b": target_condition}
+    return_clause = ", ".join(build_return_clause(alias, conditions[alias], alias == "r") for alias in returns)
+    
+    query = f"MATCH (a{source_label}){relationship_pattern}{target_pattern}{where_clause} RETURN {return_clause}"
+    
+    # 构建参数字典
+    params = {}
+    for key, value in source_condition.properties.items():
+        params[f"a_{key}"] = value
+    if relationship_condition and relationship_condition.properties:
+        for key, value in relationship_condition.properties.items():
+            params[f"r_{key}"] = value
+    if target_condition and target_condition.properties:
+        for key, value in target_condition.properties.items():
+            params[f"b_{key}"] = value
+    return query, params
+
+
+def records_to_graph(records, returns=("a", "r", "b")):
+    """
+    把 build_condition_query 的查询结果转换为节点列表和关系列表
+    
+    Returns:
+        tuple: (nodes, relationships)
+    """
+    nodes = []
+    relationships = []
+    
+    for record in records:
+        keys = record.keys()
+        for alias in returns:
+            if f"{alias}_properties" in keys:
+                # 只返回了部分属性
+                if alias == "r":
+                    relationships.append(Relationship(
+                        id=record[f"{alias}_id"],
+                        type=record[f"{alias}_type"],
+                        properties=record[f"{alias}_properties"]
+                    ))
+                else:
+                    nodes.append(Node(
+                        id=record[f"{alias}_id"],
+                        labels=record[f"{alias}_labels"],
+                        properties=record[f"{alias}_properties"]
+                    ))
+            elif record[alias] is not None:
+                if alias == "r":
+                    relationships.append(Relationship.from_entity(record[alias]))
+                else:
+                    nodes.append(Node.from_entity(record[alias]))
+    return nodes, relationships
+
+
+def build_rank_query(from_label, relationship_type, to_label, with_properties=True,
+                     weight_property=None, degree_property=None):
+    """
+    按关联次数（或起始节点权重之和）聚合排序的查询，参数为 $names、$limit
+    
+    ORDER BY ... LIMIT 由数据库以 Top-K 方式执行，只保留前 $limit 个结果
+    """
+    properties = "d {.*}" if with_properties else "{}"
+    score = f"sum(coalesce(s.{weight_property}, 1.0))" if weight_property else "toFloat(count(*))"
+    degree = f"coalesce(d.{degree_property}, 0), " if degree_property else ""
+    return f"""
+    UNWIND $names AS name
+    MATCH (s:{from_label} {{name: name}})-[:{relationship_type}]->(d:{to_label})
+    WITH d, count(*) AS count, {score} AS score
+    ORDER BY score DESC, count DESC, {degree}d.name
+    LIMIT $limit
+    RETURN d.name AS name, count, score, {properties} AS properties
+    """
+
+
+def build_traversal_query(start_label, hops):
+    """
+    多跳遍历查询，参数为 $names 和每一跳的 $limit1..$limitN
+    
+    每一跳在 CALL 子查询中以整个上一跳为起点批量扩展，ORDER BY ... LIMIT 限制保留的节点数
+    """
+    lines = [
+        "UNWIND $names AS name",
+        f"MATCH (n:{start_label} {{name: name}})",
+        "WITH collect(DISTINCT n) AS frontier0",
+        "WITH frontier0, frontier0 AS visited",
+    ]
+    hop_columns = []
+    for i, hop in enumerate(hops, 1):
+        rel_type = ":" + "|".join(hop.relationship_types) if hop.relationship_types else ""
+        if hop.direction == "outgoing":
+            pattern = f"-[{rel_type}]->"
+        elif hop.direction == "incoming":
+            pattern = f"<-[{rel_type}]-"
+        else:  # both
+            pattern = f"-[{rel_type}]-"
+        label = f":{hop.label}" if hop.label else ""
+        if hop.return_properties:
+            properties = "dst {" + ", ".join(f".{key}" for key in hop.return_properties) + "}"
+        else:
+            properties = "{}"
+        hop_columns.append(f"hop{i}")
+        lines.append(f"""CALL {{
+        WITH frontier{i - 1}, visited
+        UNWIND frontier{i - 1} AS src
+        MATCH (src){pattern}(dst{label})
+        WHERE NOT dst IN visited
+        WITH dst, count(*) AS count, collect(DISTINCT src.name) AS sources
+        ORDER BY count DESC, dst.name
+        LIMIT $limit{i}
+        RETURN collect(dst) AS frontier{i},
+               collect({{name: dst.name, count: count, sources: sources, properties: {properties}}}) AS hop{i}
+    }}""")
+        lines.append(f"WITH frontier{i}, visited + frontier{i} AS visited, {', '.join(hop_columns)}")
+    lines.append(f"RETURN {', '.join(hop_columns)}")
+    return "\n    ".join(lines)
+
+
+def build_create_nodes_query(label):
+    """批量创建节点的查询，参数为 $rows，按顺序返回id"""
+    return f"UNWIND $rows AS row CREATE (n:{label}) SET n = row RETURN id(n) AS id"
+
+
+def build_merge_edges_query(from_label, relationship_type, to_label):
+    """
+    批量合并关系的查询，参数为 $rows、$properties，每行返回一条记录表示是否找到两端节点
+
+    两端先各自按行聚合成去重的节点列表，避免同名节点产生笛卡尔积和重复的结果行
+    """
+    return f"""
+    UNWIND $rows AS row
+    OPTIONAL MATCH (a:{from_label} {{name: row[0]}})
+    WITH row, collect(DISTINCT a) AS starts
+    OPTIONAL MATCH (b:{to_label} {{name: row[1]}})
+    WITH row, starts, collect(DISTINCT b) AS ends
+    FOREACH (a IN starts | FOREACH (b IN ends |
+        MERGE (a)-[r:{relationship_type}]->(b)
+        SET r += $properties))
+    RETURN row, size(starts) > 0 AND size(ends) > 0 AS ok
+    """
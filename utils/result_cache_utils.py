@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from utils.logger_utils import info, error
+
+
+def normalize_entities(entities):
+    """去掉首尾空白、去重并排序，相同的实体集合得到相同的缓存键"""
+    return sorted({entity.strip() for entity in entities if entity and entity.strip()})
+
+
+class ResultCache:
+    """
+    图谱查询结果缓存
+
+    进程内为有上限的 LRU 缓存，每条结果在 ttl 秒后过期；缓存键包含构建清单的版本，
+    create_graph.py 写出新版本后旧结果自动失效。
+    指定 shared_path 后额外使用一个 sqlite 文件作为共享缓存，同一台机器上的多个工作进程共享命中。
+    """
+
+    def __init__(self, manifest_path, max_size=1024, ttl=300, shared_path=None):
+        self.manifest_path = manifest_path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_path = shared_path
+        self.version = None
+        self.manifest_mtime = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 当前线程是否绕过缓存，见 bypass
+        self._local = threading.local()
+        self._metrics = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._shared = None
+        if shared_path:
+            self._shared = sqlite3.connect(shared_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._shared.execute("PRAGMA journal_mode=WAL")
+            self._shared.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache "
+                "(key TEXT PRIMARY KEY, version TEXT, expires REAL, value BLOB)")
+            info(f"共享结果缓存: {shared_path}")
+
+    def _current_version(self):
+        """按清单文件的修改时间检查构建版本，版本变化时清空进程内缓存"""
+        mtime = os.path.getmtime(self.manifest_path) if os.path.exists(self.manifest_path) else None
+        if mtime == self.manifest_mtime:
+            return self.version
+        self.manifest_mtime = mtime
+        version = None
+        if mtime is not None:
+            try:
+                with open(self.manifest_path, encoding='utf-8') as f:
+                    version = json.load(f)['version']
+            except Exception as e:
+                error(f"读取构建清单失败: {str(e)}")
+        if version != self.version:
+            if self._entries:
+                self._metrics['invalidations'] += 1
+                info(f"图谱版本变化 {self.version} -> {version}, 清空结果缓存 {len(self._entries)} 条")
+            self._entries.clear()
+            if self._shared:
+                self._shared.execute("DELETE FROM result_cache WHERE version IS NOT ?", (version,))
+            self.version = version
+        return version
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            tuple: (是否命中, 结果)
+        """
+        now = time.time()
+        with self._lock:
+            version = self._current_version()
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                return True, entry[1]
+            if self._shared:
+                row = self._shared.execute(
+                    "SELECT value, expires FROM result_cache WHERE key = ? AND version IS ? AND expires > ?",
+                    (key, version, now)).fetchone()
+                if row:
+                    value = pickle.loads(row[0])
+                    self._put_local(key, row[1], value)
+                    self._metrics['shared_hits'] += 1
+                    return True, value
+            self._metrics['misses'] += 1
+            return False, None
+
+    def put(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            version = self._current_version()
+            self._put_local(key, expires, value)
+            if self._shared:
+                try:
+                    self._shared.execute(
+                        "INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?)",
+                        (key, version, expires, pickle.dumps(value)))
+                except sqlite3.Error as e:
+                    error(f"写入共享结果缓存失败: {str(e)}")
+
+    def _put_local(self, key, expires, value):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._metrics['evictions'] += 1
+
+    @contextmanager
+    def bypass(self):
+        """在当前线程内绕过缓存，既不读也不写，用于测量未缓存的延迟"""
+        previous = getattr(self._local, 'bypass', False)
+        self._local.bypass = True
+        try:
+            yield
+        finally:
+            self._local.bypass = previous
+
+    def _bypassed(self):
+        return getattr(self._local, 'bypass', False)
+
+    def memoize(self, fn):
+        """
+        缓存 fn(entities, *args) 的结果
+
+        实体列表先经 normalize_entities 规范化后再传给 fn，保证缓存结果与实际查询一致；
+        结果为空（也可能是查询失败）时不缓存。同步函数和协程函数都适用，
+        协程函数的缓存读写（清单 stat、sqlite 共享缓存）放到线程中执行，不阻塞事件循环。
+        """
+        # 同名函数（如同步和异步版本）返回的结构可能不同，键中带上模块名区分
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        def make_key(entities, args, kwargs):
+            names = normalize_entities(entities)
+            return names, json.dumps([name, names, args, sorted(kwargs.items())], ensure_ascii=False)
+
+        def cacheable(result):
+            return bool(result) and bool(result[0])
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(entities, *args, **kwargs):
+                names, key = make_key(entities, args, kwargs)
+                if self._bypassed():
+                    return await fn(names, *args, **kwargs)
+                hit, result = await asyncio.to_thread(self.get, key)
+                if not hit:
+                    result = await fn(names, *args, **kwargs)
+                    if cacheable(result):
+                        await asyncio.to_thread(self.put, key, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(entities, *args, **kwargs):
+            names, key = make_key(entities, args, kwargs)
+            if self._bypassed():
+                return fn(names, *args, **kwargs)
+            hit, result = self.get(key)
+            if not hit:
+                result = fn(names, *args, **kwargs)
+                if cacheable(result):
+                    self.put(key, result)
+            return result
+        return wrapper
+
+    def metrics(self):
+        """返回命中、未命中、淘汰、失效次数和命中率"""
+        with self._lock:
+            metrics = dict(self._metrics, size=len(self._entries), version=self.version)
+        total = metrics['hits'] + metrics['shared_hits'] + metrics['misses']
+        metrics['hit_rate'] = (metrics['hits'] + metrics['shared_hits']) / total if total else 0.0
+        return metrics
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._shared:
+                self._shared.execute("DELETE FROM result_cache")